@@ -0,0 +1,244 @@
+"""Headless RAG service: the pipeline behind app.py as an async HTTP API.
+
+Run with ``python api.py`` (RAG_API_WORKERS processes) or ``uvicorn api:app``.
+Each worker process loads the models and opens the LanceDB table once and
+shares them across requests; per-stage semaphores bound the concurrent work.
+With several workers ``python api.py`` builds the database before starting
+them and requires conversation checkpoints every worker can see.
+"""
+import asyncio
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, field_validator
+import pandas as pd
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from src.feedback import store_feedback
+from src.langgraph_workflow import initialize_rag_workflow
+from src.prompt import initialize_llm
+from src.rag import retrieve, rag_stream
+from src.text2speech import text2speech_async
+from src.voice_pipeline import start_voice_turn
+from src.warmup import start_warmup
+
+load_dotenv()
+
+host = os.getenv("RAG_API_HOST", "0.0.0.0")
+port = int(os.getenv("RAG_API_PORT", "8000"))
+workers = int(os.getenv("RAG_API_WORKERS", "1"))
+# Set when a load balancer routes every request of a thread to the same worker
+sticky_sessions = os.getenv("RAG_API_STICKY_SESSIONS", "false").lower() == "true"
+# Requests beyond these limits wait up to queue_timeout seconds, then get a 503
+max_streams = int(os.getenv("RAG_API_MAX_STREAMS", "32"))
+max_retrievals = int(os.getenv("RAG_API_MAX_RETRIEVALS", "8"))
+max_speech = int(os.getenv("RAG_API_MAX_SPEECH", "16"))
+queue_timeout = float(os.getenv("RAG_API_QUEUE_TIMEOUT", "10"))
+
+
+class RagRequest(BaseModel):
+    query: str
+    thread_id: Optional[str] = None
+    llm_choice: str = "Groq"
+    api_key: Optional[str] = None
+    k: int = 5
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    username: Optional[str] = None
+
+    @field_validator("start_date", "end_date")
+    @classmethod
+    def check_date(cls, value):
+        if value is None:
+            return value
+        try:
+            timestamp = pd.Timestamp(value)
+        except Exception:
+            timestamp = pd.NaT
+        if pd.isna(timestamp):
+            raise ValueError(f"not a date: {value!r}")
+        return value
+
+
+class TTSRequest(BaseModel):
+    text: str
+
+
+class FeedbackRequest(BaseModel):
+    query: str
+    response: str
+    rating: int
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Semaphores belong to the worker's event loop, so they are created here
+    app.state.streams = asyncio.Semaphore(max_streams)
+    app.state.retrievals = asyncio.Semaphore(max_retrievals)
+    app.state.speech = asyncio.Semaphore(max_speech)
+    # The checkpointer is process-wide, so one compiled workflow serves every thread
+    app.state.workflow = initialize_rag_workflow()
+    app.state.warmup = start_warmup()
+    yield
+
+
+app = FastAPI(title="Elon Musk tweets RAG API", lifespan=lifespan)
+
+
+async def acquire(semaphore):
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=queue_timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Server busy, try again later")
+
+
+async def wait_ready(request):
+    # Retries a warm-up that failed, e.g. while the database volume was not mounted yet
+    warmup = request.app.state.warmup.start()
+    if not warmup.ready and not await run_in_threadpool(warmup.wait, queue_timeout):
+        raise HTTPException(status_code=503, detail=f"Warming up ({warmup.step or warmup.error})")
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/health")
+async def health(request: Request):
+    from src import context_builder, deepgram_client, embedding_cache, llm_clients, llm_dispatch, vectordb
+    from src.db_pool import pool
+    from src.prompt import generation_flight, ttft_stats
+    from src.rag import retrieval_cache, retrieval_flight
+    from src.voice_pipeline import speculation_stats
+
+    warmup = request.app.state.warmup
+    return {
+        "ready": warmup.ready,
+        "warmup": warmup.status(),
+        "retrieval_cache": retrieval_cache.stats(),
+        "voice_speculation": dict(speculation_stats),
+        "coalescing": {"retrieval": retrieval_flight.stats(), "generation": generation_flight.stats()},
+        "search": vectordb.search_stats(),
+        "llm_clients": llm_clients.stats(),
+        "llm_providers": llm_dispatch.stats(),
+        "tokens": context_builder.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "deepgram": deepgram_client.stats(),
+        "ttft": ttft_stats.snapshot(),
+        "db_pool": pool.stats(),
+    }
+
+
+@app.post("/rag")
+async def rag_endpoint(body: RagRequest, request: Request):
+    """Stream the answer as server-sent events: ``urls``, then ``token`` events, then ``done`` (or ``error``)"""
+    await wait_ready(request)
+    thread_id = body.thread_id or str(uuid.uuid4())
+    filters = {"start_date": body.start_date, "end_date": body.end_date, "username": body.username}
+
+    await acquire(request.app.state.retrievals)
+    try:
+        retrieval = await run_in_threadpool(retrieve, body.query, body.k, **filters)
+    finally:
+        request.app.state.retrievals.release()
+
+    await acquire(request.app.state.streams)
+    try:
+        llm = initialize_llm(body.llm_choice, body.api_key)
+        tokens, urls = rag_stream(thread_id, request.app.state.workflow, body.query, retrieval=retrieval, llm=llm)
+    except Exception:
+        request.app.state.streams.release()
+        raise
+
+    async def events():
+        try:
+            yield sse("urls", {"urls": urls, "thread_id": thread_id})
+            # The LangGraph stream is synchronous, so each token is pulled on a worker thread
+            async for token in iterate_in_threadpool(iter(tokens)):
+                yield sse("token", {"text": token})
+            yield sse("done", {"ttft": tokens.ttft})
+        except Exception as e:
+            yield sse("error", {"message": str(e)})
+        finally:
+            request.app.state.streams.release()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"X-Thread-Id": thread_id})
+
+
+def prefetch_retrieval(voice_turn):
+    # Leaves the result in the retrieval cache (or in flight) for the /rag request that follows
+    try:
+        voice_turn.retrieval()
+    except Exception as e:
+        print(f"Voice retrieval prefetch failed: {str(e)}")
+
+
+@app.post("/stt")
+async def stt_endpoint(request: Request, background_tasks: BackgroundTasks):
+    """Transcribe the raw audio request body.
+
+    Transcription streams to Deepgram and retrieval starts speculatively on the
+    early transcript, as in the local voice pipeline; retrieval for the final
+    transcript then runs in the background, so the client's following /rag call
+    joins it or finds it cached. ``speculation`` reports hit, miss or skipped.
+    """
+    audio = await request.body()
+    if not audio:
+        raise HTTPException(status_code=400, detail="Empty audio")
+    await acquire(request.app.state.speech)
+    try:
+        voice_turn = start_voice_turn(audio)
+        transcript = await run_in_threadpool(voice_turn.transcript)
+    except Exception as e:
+        print(f"Exception: {e}")
+        raise HTTPException(status_code=502, detail="Transcription failed")
+    finally:
+        request.app.state.speech.release()
+    print(f"Transcript: {transcript}")
+    speculation = voice_turn.speculation()
+    if transcript:
+        background_tasks.add_task(prefetch_retrieval, voice_turn)
+    return {"transcript": transcript, "speculation": speculation}
+
+
+@app.post("/tts")
+async def tts_endpoint(body: TTSRequest, request: Request):
+    """Synthesize ``text`` and return it as WAV audio"""
+    await acquire(request.app.state.speech)
+    try:
+        audio = await text2speech_async(body.text)
+    finally:
+        request.app.state.speech.release()
+    if audio is None:
+        raise HTTPException(status_code=502, detail="Speech synthesis failed")
+    return Response(content=audio, media_type="audio/wav")
+
+
+@app.post("/feedback")
+async def feedback_endpoint(body: FeedbackRequest):
+    await run_in_threadpool(store_feedback, body.query, body.response, body.rating)
+    return {"stored": True}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    from src.checkpointer import SHARED_BACKENDS, backend, is_shared
+
+    # With several workers every process loads its own models; the on-disk embedding cache is shared
+    if workers > 1:
+        # Each worker has its own in-memory checkpointer, so a thread would lose its history
+        # whenever a request lands on another worker
+        if backend in SHARED_BACKENDS and not is_shared():
+            raise SystemExit(f"CHECKPOINT_BACKEND={backend} needs {SHARED_BACKENDS[backend]}, which is not installed")
+        if not (is_shared() or sticky_sessions):
+            raise SystemExit("RAG_API_WORKERS > 1 needs CHECKPOINT_BACKEND=sqlite (langgraph-checkpoint-sqlite) "
+                             "or RAG_API_STICKY_SESSIONS=true behind a load balancer that pins threads to workers")
+        # Build the table once here, so the workers' warm-ups only open it instead of racing on ingestion
+        from init_lancedb import initialize_database
+        initialize_database()
+        os.environ["DATABASE_INITIALIZED"] = "1"
+    uvicorn.run("api:app", host=host, port=port, workers=workers)
@@ -1,20 +1,28 @@
 import streamlit as st
+from dotenv import load_dotenv
 from langchain_core.messages import AIMessage, HumanMessage
-from init_lancedb import initialize_database
-from src.rag import rag
-from src.feedback import store_feedback
-from src.text2speech import text2speech
-from src.speech2text import speech2text
-from utils.remove_emojis import remove_emojis
-import time
+from src.tts_stream import StreamingTTS
 import re
+import uuid
 from utils.autoplay_audio import autoplay_audio
 from utils.get_ratings_from_emoji import get_rating_from_emoji
 import os
 from streamlit_feedback import streamlit_feedback
-from src.prompt import initialize_llm
-from src.langgraph_workflow import initialize_rag_workflow
-from utils.clean_for_tts import clean_for_tts
+
+load_dotenv()
+
+# With RAG_API_URL set the app is a thin client of api.py and loads no models or database itself
+rag_api_url = os.getenv("RAG_API_URL")
+if rag_api_url:
+    from src import api_client
+    from src.api_client import store_feedback, start_voice_turn, start_warmup
+else:
+    from src.rag import rag_stream
+    from src.feedback import store_feedback
+    from src.voice_pipeline import start_voice_turn
+    from src.prompt import initialize_llm
+    from src.langgraph_workflow import initialize_rag_workflow
+    from src.warmup import start_warmup
 
 def feedback_cb():
     feedback = st.session_state.fb_k
@@ -36,8 +44,6 @@ def feedback_cb():
             st.toast("Error saving feedback", icon="🚨")
             print(f"Error storing feedback: {str(e)}")
 
-audio_response = "audio_response.mp3"
-audio_query = "audio_query.wav"
 
 # Robust image loading with multiple fallbacks for production environments
 def load_header_image():
@@ -106,8 +112,14 @@ st.sidebar.text("If you want to try other LLM models.")
 llm_choice = st.sidebar.selectbox("Choose LLM Model", llm_options)
 api_key = st.sidebar.text_input(f"Enter {llm_choice} API Key:", type="password")
 
-with st.spinner("Setting up the database. This may take 3-6 minutes..."):
-    initialize_database()
+# Database setup and model loading run once per process in the background
+warmup = start_warmup()
+if warmup.ready:
+    st.sidebar.success("Database and models ready")
+elif warmup.state == "failed":
+    st.sidebar.error(f"Setup failed: {warmup.error}")
+else:
+    st.sidebar.info(f"Setting up ({warmup.step or 'starting'})... You can type your question meanwhile.")
 
 # Initialize chat history and feedback state
 if "chat_history" not in st.session_state:
@@ -121,12 +133,13 @@ if "audio_bytes" not in st.session_state:
 if "feedback_status" not in st.session_state:
     st.session_state.feedback_status = {}
 
-llm = initialize_llm(llm_choice, api_key)
+llm = None if rag_api_url else initialize_llm(llm_choice, api_key)
 
 # Initialize session state for langgraph workflow
-if 'langgraph_workflow' not in st.session_state:
-    st.session_state.langgraph_workflow = initialize_rag_workflow(llm)
-    st.session_state.rag_thread_id = "1"
+if 'rag_thread_id' not in st.session_state:
+    st.session_state.langgraph_workflow = None if rag_api_url else initialize_rag_workflow(llm)
+    # Each browser session gets its own conversation thread
+    st.session_state.rag_thread_id = str(uuid.uuid4())
 
 # Display conversation history
 for message in st.session_state.chat_history:
@@ -156,28 +169,32 @@ def check_new_audio():
 # Process user input
 is_new_audio = check_new_audio()
 if user_query or is_new_audio:
-    if os.path.exists(audio_response):
-        os.remove(audio_response)
+    # Start transcription (and speculative retrieval) first so it overlaps the warm-up wait
+    voice_turn = start_voice_turn(audio.getbuffer()) if is_new_audio else None
+
+    if not warmup.ready:
+        with st.spinner("Setting up the database and models. This may take 3-6 minutes on first start..."):
+            if not warmup.wait():
+                st.error(f"Setup failed: {warmup.error}")
+                st.stop()
+
     if is_new_audio:
-        with open(audio_query, "wb") as f:
-            f.write(audio.read())
         with st.chat_message("Human"):
+            # The echo plays in the browser and does not hold up transcription or retrieval
+            autoplay_audio(audio.getbuffer(), mime=audio.type or "audio/wav")
             try:
                 with st.spinner("Transcribing audio..."):
-                    transcribed_text = speech2text(audio_query)
+                    transcribed_text = voice_turn.transcript()
                     if not transcribed_text or transcribed_text.strip() == "":
                         raise ValueError("No text transcribed")
                     
                     st.session_state.chat_history.append(HumanMessage(content=transcribed_text))
-                    autoplay_audio(audio_query)
                     st.markdown(transcribed_text)
                     user_query = transcribed_text
             except Exception as e:
                 st.error(f"Failed to transcribe audio. Error: {e}")
                 st.stop()
-            finally:
-                os.remove(audio_query)
-                    
+
     elif user_query:
         st.session_state.chat_history.append(HumanMessage(content=user_query))
         with st.chat_message("Human"):
@@ -187,21 +204,28 @@ if user_query or is_new_audio:
 
     with st.chat_message("AI"):
         response_container = st.empty()
+        audio_container = st.empty()
         response_text = ""
 
         try:
-            with st.spinner("Generating response..."):
-                full_response, chunks, urls = rag(st.session_state.rag_thread_id, st.session_state.langgraph_workflow, user_query, llm_choice, api_key)
-
-            with st.spinner("Generating audio..."):
-                audio_file = text2speech(clean_for_tts(remove_emojis(full_response)), filename=audio_response)
-            if audio_file:
-                autoplay_audio(audio_response)
-
-            for chunk in chunks:
-                response_text += chunk
+            with st.spinner("Searching tweets..."):
+                if rag_api_url:
+                    tokens, urls = api_client.rag_stream(st.session_state.rag_thread_id, user_query, llm_choice, api_key)
+                else:
+                    retrieval = voice_turn.retrieval() if voice_turn else None
+                    tokens, urls = rag_stream(st.session_state.rag_thread_id, st.session_state.langgraph_workflow, user_query, retrieval=retrieval, llm=llm)
+
+            # Render tokens as the LLM produces them and speak each sentence as soon as it is complete
+            tts = StreamingTTS(synthesize=api_client.text2speech) if rag_api_url else StreamingTTS()
+            for token in tokens:
+                response_text += token
                 response_container.write(response_text)
-                time.sleep(0.03)
+                tts.feed(token)
+                segment = tts.poll()
+                if segment:
+                    with audio_container:
+                        autoplay_audio(segment)
+            tts.close()
 
             st.session_state.chat_history.append(AIMessage(content=response_text))
 
@@ -209,6 +233,11 @@ if user_query or is_new_audio:
                 streamlit_feedback(feedback_type="faces", align="flex-start", key='fb_k')
                 st.form_submit_button('Submit feedback', on_click=feedback_cb)
 
+            # Play the remaining sentences in order, each once the previous one has finished
+            for segment in tts.drain():
+                with audio_container:
+                    autoplay_audio(segment)
+
         except Exception as e:
             error_str = str(e)
             match = re.search(r"'message':\s'(.+?)'", error_str)
@@ -0,0 +1,132 @@
+"""Compare the torch and ONNX (int8) encoder backends for parity, latency, throughput and memory.
+
+Each backend runs in its own process so peak RSS is measured separately:
+
+    python -m benchmarks.encoders --samples 512 --output encoders.json
+
+Exits with status 1 when the ONNX outputs drift beyond the parity thresholds.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+QUERIES = [
+    "What did Elon Musk tweet about Starship?",
+    "What does Elon think about electric cars?",
+    "When is the next SpaceX launch?",
+    "What did Elon say about artificial intelligence?",
+    "Has Elon tweeted about Tesla stock?",
+    "What are Elon's thoughts on free speech?",
+    "What did Elon Musk say about Mars colonization?",
+    "Did Elon mention Neuralink?",
+]
+
+
+def run_backend(backend, texts, queries, pairs_per_query, batch_size):
+    """Load both models with ``backend`` and measure them; runs inside a fresh process"""
+    from src import encoders
+    from utils.metrics import LatencyStats
+
+    start = time.perf_counter()
+    encoders.get_embedder(backend)
+    encoders.get_cross_encoder(backend)
+    load_seconds = time.perf_counter() - start
+
+    # One short query at a time, as at request time
+    query_latency = LatencyStats()
+    for query in queries * 4:
+        start = time.perf_counter()
+        encoders.embed_texts([query], backend=backend, cache=False)
+        query_latency.record(time.perf_counter() - start)
+
+    # Batched passages, as during ingestion
+    start = time.perf_counter()
+    embeddings = encoders.embed_texts(texts, backend=backend, batch_size=batch_size, cache=False)
+    embed_seconds = time.perf_counter() - start
+
+    rerank_latency = LatencyStats()
+    scores = []
+    for query in queries:
+        pairs = [(query, text) for text in texts[:pairs_per_query]]
+        start = time.perf_counter()
+        scores.append(np.asarray(encoders.rerank_scores(pairs, backend=backend, batch_size=batch_size)))
+        rerank_latency.record(time.perf_counter() - start)
+
+    metrics = {
+        "load_seconds": load_seconds,
+        "query_embedding": query_latency.snapshot(),
+        "passages_per_second": len(texts) / embed_seconds,
+        f"rerank_{pairs_per_query}_pairs": rerank_latency.snapshot(),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    return metrics, embeddings, np.stack(scores)
+
+
+def _in_process(backend, *args):
+    # spawn, so the parent's imported models and allocations do not count towards RSS
+    with multiprocessing.get_context("spawn").Pool(1) as process:
+        return process.apply(run_backend, (backend, *args))
+
+
+def parity(reference, candidate, reference_scores, candidate_scores, k=5):
+    """Compare candidate outputs with the reference (torch) outputs"""
+    # Embeddings are unit length, so the row-wise dot product is the cosine similarity
+    cosine = np.sum(reference * candidate, axis=1)
+    # Spearman correlation is the Pearson correlation of the ranks
+    spearman = [pd.Series(ref).rank().corr(pd.Series(cand).rank())
+                for ref, cand in zip(reference_scores, candidate_scores)]
+    top_k = [len(set(np.argsort(-ref)[:k]) & set(np.argsort(-cand)[:k])) / k
+             for ref, cand in zip(reference_scores, candidate_scores)]
+    return {
+        "embedding_cosine_min": float(cosine.min()),
+        "embedding_cosine_mean": float(cosine.mean()),
+        "rerank_spearman_min": float(np.min(spearman)),
+        "rerank_max_abs_diff": float(np.max(np.abs(reference_scores - candidate_scores))),
+        f"rerank_top{k}_overlap": float(np.mean(top_k)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", help="tweets CSV (default: the one init_lancedb ingests)")
+    parser.add_argument("--samples", type=int, default=256, help="tweets to embed")
+    parser.add_argument("--pairs", type=int, default=20, help="passages reranked per query")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--min-spearman", type=float, default=0.95)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    from init_lancedb import find_csv_path, load_tweets
+
+    tweets = load_tweets(args.csv or find_csv_path())
+    texts = tweets["text"][tweets["text"] != ""].head(args.samples).tolist()
+
+    report = {"samples": len(texts), "backends": {}}
+    outputs = {}
+    for backend in ("torch", "onnx"):
+        print(f"Benchmarking the {backend} backend...")
+        metrics, embeddings, scores = _in_process(backend, texts, QUERIES, args.pairs, args.batch_size)
+        report["backends"][backend] = metrics
+        outputs[backend] = (embeddings, scores)
+
+    (torch_embeddings, torch_scores), (onnx_embeddings, onnx_scores) = outputs["torch"], outputs["onnx"]
+    report["parity"] = parity(torch_embeddings, onnx_embeddings, torch_scores, onnx_scores)
+    report["parity"]["passed"] = (report["parity"]["embedding_cosine_min"] >= args.min_cosine
+                                  and report["parity"]["rerank_spearman_min"] >= args.min_spearman)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["parity"]["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Evaluate retrieval strategies for quality (hit rate, MRR) and speed (latency, throughput).
+
+Ported from the evaluation in notebooks/main.ipynb, but run against the live
+LanceDB table and the search code in src/vectordb.py:
+
+    python -m benchmarks.retrieval --limit 200 --output retrieval.json
+
+The ground truth is a CSV with ``question`` and ``tweet_id`` columns, as
+produced by notebooks/groundtruth-llm-gen.ipynb.
+"""
+import argparse
+import json
+import os
+import time
+import pandas as pd
+
+STRATEGIES = ["minsearch", "fts", "vector", "hybrid_rrf", "hybrid_linear", "crossencoder"]
+
+
+def hit_rate(relevance_total):
+    return sum(True in line for line in relevance_total) / len(relevance_total)
+
+
+def mrr(relevance_total):
+    total_score = 0.0
+    for line in relevance_total:
+        for rank, relevant in enumerate(line):
+            if relevant:
+                total_score += 1 / (rank + 1)
+    return total_score / len(relevance_total)
+
+
+def load_ground_truth(path, limit=None):
+    df_question = pd.read_csv(path)
+    df_question["question"] = df_question["question"].str.replace("\n", " ").str.replace('"', "").str.strip()
+    if limit:
+        df_question = df_question.head(limit)
+    return df_question[["question", "tweet_id"]].to_dict(orient="records")
+
+
+class KeywordIndex:
+    """TF-IDF keyword search over the tweet texts, equivalent to the notebook's minsearch index"""
+
+    def __init__(self, table):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        rows = table.search().select(["tweet_id", "text"]).limit(max(len(table), 1)).to_pandas()
+        self.tweet_ids = rows["tweet_id"].tolist()
+        self.vectorizer = TfidfVectorizer(stop_words="english", min_df=1)
+        self.matrix = self.vectorizer.fit_transform(rows["text"])
+
+    def search(self, query, k=5):
+        # TF-IDF rows are L2-normalized, so the dot product is the cosine similarity
+        scores = (self.matrix @ self.vectorizer.transform([query]).T).toarray().ravel()
+        top = scores.argsort()[::-1][:k]
+        return [{"tweet_id": self.tweet_ids[i]} for i in top if scores[i] > 0]
+
+
+def make_strategies(k):
+    """Return ``{name: search(query) -> ranked hits}`` built on src.vectordb"""
+    from src import vectordb
+
+    table = vectordb.get_table(vectordb.table_name, vectordb.db_path)
+
+    def vector(query):
+        query_vector = vectordb.embed_queries([query])[0]
+        return vectordb.vector_search(table, query_vector).select(["tweet_id"]).limit(k).to_list()
+
+    def fts(query):
+        return table.search(query, query_type="fts").select(["tweet_id"]).limit(k).to_list()
+
+    def fused(fusion):
+        return lambda query: vectordb.candidate_hits([query], k, fusion=fusion)[0]
+
+    def crossencoder(query):
+        return vectordb.search_hits([query], k)[0]
+
+    keyword_index = {}
+
+    def minsearch(query):
+        if "index" not in keyword_index:
+            keyword_index["index"] = KeywordIndex(table)
+        return keyword_index["index"].search(query, k)
+
+    return {
+        "minsearch": minsearch,
+        "fts": fts,
+        "vector": vector,
+        "hybrid_rrf": fused("rrf"),
+        "hybrid_linear": fused("linear"),
+        "crossencoder": crossencoder,
+    }
+
+
+def evaluate(ground_truth, search_function):
+    from utils.metrics import LatencyStats
+
+    # The first call loads models and indexes, so it is not timed
+    search_function(ground_truth[0]["question"])
+
+    latency = LatencyStats(window=len(ground_truth))
+    relevance_total = []
+    start = time.perf_counter()
+    for question in ground_truth:
+        query_start = time.perf_counter()
+        results = search_function(question["question"])
+        latency.record(time.perf_counter() - query_start)
+        relevance_total.append([hit["tweet_id"] == question["tweet_id"] for hit in results])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "hit_rate": hit_rate(relevance_total),
+        "mrr": mrr(relevance_total),
+        "latency": latency.snapshot(),
+        "queries_per_second": len(ground_truth) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ground-truth", default=os.path.join("data", "ground_truth_data.csv"))
+    parser.add_argument("--limit", type=int, help="evaluate only the first N questions")
+    parser.add_argument("-k", type=int, default=5, help="results per query")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=STRATEGIES)
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="encode every query instead of reading the on-disk embedding cache")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    if args.no_embedding_cache:
+        os.environ["EMBEDDING_CACHE_DIR"] = ""
+
+    from src import encoders, vectordb
+
+    ground_truth = load_ground_truth(args.ground_truth, args.limit)
+    strategies = make_strategies(args.k)
+    report = {
+        "questions": len(ground_truth),
+        "k": args.k,
+        "config": {
+            "inference_backend": encoders.inference_backend,
+            "nprobes": vectordb.nprobes,
+            "refine_factor": vectordb.refine_factor,
+            "rerank_candidates": vectordb.rerank_candidates,
+            "rerank_fusion": vectordb.rerank_fusion,
+        },
+        "strategies": {},
+    }
+    for name in args.strategies:
+        print(f"Evaluating {name} on {len(ground_truth)} questions...")
+        report["strategies"][name] = evaluate(ground_truth, strategies[name])
+        result = report["strategies"][name]
+        print(f"{name}: hit rate {result['hit_rate']:.3f}, MRR {result['mrr']:.3f}, "
+              f"p95 {result['latency']['p95_ms']:.1f} ms, {result['queries_per_second']:.1f} queries/s")
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
 import os
+import json
+import hashlib
+from datetime import datetime
 import pandas as pd
+import pyarrow as pa
 from dotenv import load_dotenv
-import lancedb
 from lancedb.pydantic import LanceModel, Vector
-from lancedb.embeddings import get_registry
+from src.db_pool import pool, get_connection, get_table
+from src.encoders import embed_texts, embedding_dimensions
 
 load_dotenv()
 
@@ -26,28 +30,227 @@ if not table_name:
 # Ensure the directory exists
 os.makedirs(db_path, exist_ok=True)
 
-model = get_registry().get("sentence-transformers").create(name="all-mpnet-base-v2")
+# Rows written per merge-insert during ingestion; progress is checkpointed after each batch
+ingest_batch_size = int(os.getenv("LANCEDB_INGEST_BATCH_SIZE", "1000"))
+checkpoint_path = os.path.join(db_path, f"{table_name}.ingest.json")
+
+# Below this many rows a brute-force vector scan is fast enough and no ANN index is built
+vector_index_min_rows = int(os.getenv("LANCEDB_VECTOR_INDEX_MIN_ROWS", "50000"))
+# IVF_PQ, IVF_HNSW_SQ or IVF_HNSW_PQ
+vector_index_type = os.getenv("LANCEDB_VECTOR_INDEX_TYPE", "IVF_PQ")
+# Scalar indexes used by filters and lookups, with the index type suited to each column
+scalar_indexes = {"created_at": "BTREE", "tweet_id": "BTREE", "username": "BITMAP"}
 
 class TweetDocument(LanceModel):
     tweet_count: int
     tweet_id: int
     username: str
-    text: str = model.SourceField()
-    created_at: str
+    text: str
+    # Naive UTC timestamp, so date-range filters can be pushed down to a scalar index
+    created_at: datetime
     url: str
-    vector: Vector(model.ndims()) = model.VectorField()
+    # Unit-length embedding of text, computed by src.encoders
+    vector: Vector(embedding_dimensions)
+
+db = get_connection(db_path)
+
+def find_csv_path():
+    """Locate elonmusk_tweets.csv relative to the script, the working directory or the parent directory"""
+    csv_path = os.path.join(script_dir, "data", "elonmusk_tweets.csv")
+
+    # If the file doesn't exist in the expected location, try alternative paths
+    if not os.path.exists(csv_path):
+        # Try current directory
+        csv_path = "data/elonmusk_tweets.csv"
+        if not os.path.exists(csv_path):
+            # Try parent directory
+            csv_path = os.path.join(os.path.dirname(script_dir), "data", "elonmusk_tweets.csv")
+            if not os.path.exists(csv_path):
+                raise FileNotFoundError(f"Could not find elonmusk_tweets.csv in expected locations. Script dir: {script_dir}")
+    return csv_path
+
+def load_tweets(csv_path):
+    """Load the tweets CSV and return a cleaned DataFrame with the TweetDocument columns"""
+    print(f"Loading CSV from: {csv_path}")
+
+    # Try to read CSV with different encodings
+    try:
+        tweets_df = pd.read_csv(csv_path, encoding='utf-8')
+    except UnicodeDecodeError:
+        try:
+            tweets_df = pd.read_csv(csv_path, encoding='latin-1')
+        except UnicodeDecodeError:
+            tweets_df = pd.read_csv(csv_path, encoding='cp1252')
+
+    print(f"Loaded CSV with {len(tweets_df)} rows")
+    print(f"CSV columns: {tweets_df.columns.tolist()}")
+
+    # Clean the data and handle missing URLs
+    def clean_text(text):
+        if pd.isna(text):
+            return ""
+        return str(text).replace('\xa0', ' ').replace('\u00a0', ' ').strip()
+
+    # Apply text cleaning
+    tweets_df['text'] = tweets_df['text'].apply(clean_text)
+    tweets_df['username'] = tweets_df['username'].apply(clean_text)
+
+    # Generate URL if missing
+    if 'url' not in tweets_df.columns:
+        tweets_df['url'] = tweets_df.apply(
+            lambda row: f"https://twitter.com/{row['username']}/status/{row['tweet_id']}" 
+            if pd.notna(row.get('tweet_id')) and pd.notna(row.get('username')) 
+            else "", axis=1
+        )
+
+    tweets_df = tweets_df.rename(columns={"created at": "created_at"})
+    tweets_df['created_at'] = parse_created_at(tweets_df['created_at'])
+    return tweets_df[["tweet_count", "tweet_id", "username", "text", "created_at", "url"]]
+
+def parse_created_at(values):
+    """Parse free-form created_at strings into naive UTC timestamps (unparseable values become the epoch)"""
+    timestamps = pd.to_datetime(values, utc=True, errors="coerce", format="mixed")
+    return timestamps.dt.tz_localize(None).fillna(pd.Timestamp(0)).astype("datetime64[us]")
+
+def migrate_created_at(db, table):
+    """Rewrite a table whose created_at column is still a string, keeping the stored vectors"""
+    print(f"Migrating '{table_name}.created_at' from string to timestamp...")
+    data = table.to_pandas()
+    data['created_at'] = parse_created_at(data['created_at'])
+    arrow_schema = TweetDocument.to_arrow_schema()
+    new_table = db.create_table(
+        table_name,
+        pa.Table.from_pandas(data[arrow_schema.names], schema=arrow_schema, preserve_index=False),
+        mode="overwrite",
+        schema=TweetDocument,
+    )
+    pool.invalidate(table_name, db_path)
+    # Overwriting drops all indexes, so build them again
+    ensure_indexes(new_table)
+    return new_table
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def _csv_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {"csv_path": os.path.abspath(csv_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+def _read_checkpoint():
+    try:
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _write_checkpoint(checkpoint):
+    # Write to a temporary file first so an interrupted write never corrupts the checkpoint
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def ingestion_pending(csv_path):
+    """Return True when a previous ingestion of ``csv_path`` was interrupted before completing"""
+    checkpoint = _read_checkpoint()
+    return (checkpoint is not None
+            and not checkpoint.get("complete")
+            and {k: checkpoint.get(k) for k in ("csv_path", "size", "mtime")} == _csv_signature(csv_path))
+
+def ingest_tweets(table, csv_path, batch_size=ingest_batch_size):
+    """Add only new or changed tweets from ``csv_path`` to ``table``.
+
+    Rows are keyed by ``tweet_id`` plus a hash of the tweet text, written with
+    merge-insert in batches of ``batch_size``, and progress is checkpointed after
+    every batch so an interrupted run resumes where it stopped. Re-ingesting an
+    already completed CSV returns immediately.
+    """
+    signature = _csv_signature(csv_path)
+    checkpoint = _read_checkpoint()
+    if checkpoint is None or {k: checkpoint.get(k) for k in signature} != signature:
+        checkpoint = dict(signature, next_row=0, complete=False, written=0)
+    elif checkpoint.get("complete"):
+        print(f"CSV {csv_path} already ingested, nothing to do")
+        return 0
+
+    tweets_df = load_tweets(csv_path)
+
+    # Hash the text already stored so unchanged tweets are skipped without re-embedding
+    existing = table.search().select(["tweet_id", "text"]).limit(max(len(table), 1)).to_pandas()
+    existing_hashes = dict(zip(existing["tweet_id"], existing["text"].map(text_hash)))
+    print(f"Resuming ingestion at row {checkpoint['next_row']} of {len(tweets_df)} ({len(existing_hashes)} rows in table)")
 
-db = lancedb.connect(db_path)
-model = get_registry().get("sentence-transformers").create(name="all-mpnet-base-v2")
+    written = 0
+    for start in range(checkpoint["next_row"], len(tweets_df), batch_size):
+        batch = tweets_df.iloc[start:start + batch_size]
+        changed = batch[[existing_hashes.get(tweet_id) != text_hash(text)
+                         for tweet_id, text in zip(batch["tweet_id"], batch["text"])]]
+        if len(changed):
+            changed = changed.assign(vector=list(embed_texts(changed["text"])))
+            # Merge-insert does not cast its input, so match the table's (non-nullable) columns
+            (
+                table.merge_insert("tweet_id")
+                .when_matched_update_all()
+                .when_not_matched_insert_all()
+                .execute(pa.Table.from_pandas(changed, schema=table.schema, preserve_index=False))
+            )
+            written += len(changed)
+
+        checkpoint["next_row"] = start + len(batch)
+        checkpoint["written"] = checkpoint.get("written", 0) + len(changed)
+        _write_checkpoint(checkpoint)
+        print(f"Ingested rows {start}-{checkpoint['next_row']}: {len(changed)} new or changed")
+
+    # A resumed run may write nothing itself while earlier runs wrote rows the indexes have not seen
+    ensure_indexes(table, data_changed=bool(checkpoint["written"]))
+    checkpoint["complete"] = True
+    _write_checkpoint(checkpoint)
+    pool.invalidate(table_name, db_path)
+
+    print(f"Ingestion complete: {written} rows written in this run, table has {len(table)} rows")
+    return written
+
+def ensure_indexes(table, data_changed=False):
+    """Create missing FTS, scalar and vector indexes and fold newly written rows into existing ones.
+
+    The ANN vector index is only built once the table has ``vector_index_min_rows`` rows.
+    """
+    indexed = {column for index in table.list_indices() for column in index.columns}
+
+    # Optimizing adds appended rows to the existing indexes without retraining them
+    if data_changed and indexed:
+        print("Updating existing indexes with new rows...")
+        table.optimize()
 
-def initialize_database():
+    if "text" not in indexed:
+        print("Creating full-text index on 'text'")
+        table.create_fts_index("text", replace=True)
+
+    for column, index_type in scalar_indexes.items():
+        if column not in indexed:
+            print(f"Creating {index_type} scalar index on '{column}'")
+            table.create_scalar_index(column, index_type=index_type)
+
+    row_count = len(table)
+    if "vector" not in indexed and row_count >= vector_index_min_rows:
+        print(f"Creating {vector_index_type} vector index over {row_count} rows...")
+        table.create_index(metric="l2", vector_column_name="vector", index_type=vector_index_type)
+
+    pool.invalidate(table_name, db_path)
+
+def initialize_database(incremental=False):
+    """Open the tweets table, creating it or resuming an interrupted ingestion if needed.
+
+    With ``incremental=True`` the CSV is also merged into an existing table,
+    adding only new or changed tweets.
+    """
     print(f"Initializing database...")
     print(f"Script directory: {script_dir}")
     print(f"Database path: {db_path}")
     print(f"Table name: {table_name}")
     print(f"Current working directory: {os.getcwd()}")
     
-    db = lancedb.connect(db_path)
+    db = get_connection(db_path)
     
     # Debug: Print available tables
     existing_tables = db.table_names()
@@ -56,83 +259,51 @@ def initialize_database():
     if table_name in existing_tables:
         print(f"Table '{table_name}' already exists. Opening...")
         try:
-            tbl = db.open_table(table_name)
+            tbl = get_table(table_name, db_path)
             print(f"Successfully opened table '{table_name}' with {len(tbl)} rows")
-            return tbl
+            if pa.types.is_string(tbl.schema.field("created_at").type):
+                tbl = migrate_created_at(db, tbl)
         except Exception as e:
             print(f"Error opening existing table: {str(e)}")
             print("Dropping table and recreating...")
+            pool.invalidate(table_name, db_path)
             db.drop_table(table_name)
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+        else:
+            if not incremental:
+                try:
+                    resume = ingestion_pending(find_csv_path())
+                except FileNotFoundError:
+                    resume = False
+                if not resume:
+                    return tbl
+                print("Previous ingestion was interrupted. Resuming...")
+            ingest_tweets(tbl, find_csv_path())
+            return get_table(table_name, db_path)
     
     print("Creating new table...")
     try:
-        # Try to read CSV with different encodings and different possible paths
-        csv_path = os.path.join(script_dir, "data", "elonmusk_tweets.csv")
-        
-        # If the file doesn't exist in the expected location, try alternative paths
-        if not os.path.exists(csv_path):
-            # Try current directory
-            csv_path = "data/elonmusk_tweets.csv"
-            if not os.path.exists(csv_path):
-                # Try parent directory
-                csv_path = os.path.join(os.path.dirname(script_dir), "data", "elonmusk_tweets.csv")
-                if not os.path.exists(csv_path):
-                    raise FileNotFoundError(f"Could not find elonmusk_tweets.csv in expected locations. Script dir: {script_dir}")
-        
-        print(f"Loading CSV from: {csv_path}")
-        
-        try:
-            tweets_df = pd.read_csv(csv_path, encoding='utf-8')
-        except UnicodeDecodeError:
-            try:
-                tweets_df = pd.read_csv(csv_path, encoding='latin-1')
-            except UnicodeDecodeError:
-                tweets_df = pd.read_csv(csv_path, encoding='cp1252')
-        
-        print(f"Loaded CSV with {len(tweets_df)} rows")
-        print(f"CSV columns: {tweets_df.columns.tolist()}")
-        
-        # Clean the data and handle missing URLs
-        def clean_text(text):
-            if pd.isna(text):
-                return ""
-            return str(text).replace('\xa0', ' ').replace('\u00a0', ' ').strip()
-        
-        # Apply text cleaning
-        tweets_df['text'] = tweets_df['text'].apply(clean_text)
-        tweets_df['username'] = tweets_df['username'].apply(clean_text)
-        
-        # Generate URL if missing
-        if 'url' not in tweets_df.columns:
-            tweets_df['url'] = tweets_df.apply(
-                lambda row: f"https://twitter.com/{row['username']}/status/{row['tweet_id']}" 
-                if pd.notna(row.get('tweet_id')) and pd.notna(row.get('username')) 
-                else "", axis=1
-            )
-        
-        data = tweets_df.apply(
-            lambda row: {
-                "tweet_count": row["tweet_count"],
-                "tweet_id": row["tweet_id"],
-                "username": row["username"],
-                "text": row["text"],
-                "created_at": row["created at"],
-                "url": row["url"]
-            },
-            axis=1
-        ).tolist()
-        
-        print(f"Prepared {len(data)} records for insertion")
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
 
         table = db.create_table(table_name, schema=TweetDocument)
-        table.add(data)
-        table.create_fts_index("text")
+        ingest_tweets(table, find_csv_path())
 
         print(f"Table '{table_name}' created successfully with {len(table)} rows")
-        return table
+        return get_table(table_name, db_path)
         
     except Exception as e:
         print(f"Error during database initialization: {str(e)}")
         import traceback
         traceback.print_exc()
-        raise
\ No newline at end of file
+        raise
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Create or update the LanceDB tweets table")
+    parser.add_argument("--incremental", action="store_true",
+                        help="merge new or changed tweets from the CSV into an existing table")
+    args = parser.parse_args()
+    initialize_database(incremental=args.incremental)
@@ -0,0 +1 @@
+# End-to-end load tests against local stubs, run as ``python -m loadtest.run``
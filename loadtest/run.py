@@ -0,0 +1,300 @@
+"""Drive the full RAG pipeline with concurrent simulated sessions and report where it saturates.
+
+Each session runs turns like the Streamlit app: optional voice transcription
+(streamed to the live endpoint, with speculative retrieval), retrieval, the
+LangGraph workflow streaming the answer, and sentence-by-sentence TTS. Voice
+turns report which STT path they took and whether speculation hit. The LLM and Deepgram are replaced by the local stubs in ``stubs/`` unless
+``--llm-url``/``--deepgram-url`` point elsewhere:
+
+    python -m loadtest.run --sweep 1 2 4 8 16 32 --duration 60 --output loadtest.json
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import threading
+import time
+import uuid
+
+QUERIES = [
+    "What did Elon Musk tweet about Starship?",
+    "What does Elon think about electric cars?",
+    "When is the next SpaceX launch?",
+    "What did Elon say about artificial intelligence?",
+    "Has Elon tweeted about Tesla stock?",
+    "What are Elon's thoughts on free speech?",
+    "What did Elon Musk say about Mars colonization?",
+    "Did Elon mention Neuralink?",
+    "What did Elon tweet about Twitter's algorithm?",
+    "What does Elon think about remote work?",
+]
+
+STAGES = ["stt", "retrieval", "ttft", "llm", "first_audio", "turn"]
+
+
+def rss_mb():
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # Peak rather than current RSS, but better than nothing off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Session:
+    """One simulated user with its own conversation thread, like one browser session"""
+
+    def __init__(self, llm, voice_ratio, speak):
+        from src.langgraph_workflow import initialize_rag_workflow
+
+        self.llm = llm
+        self.workflow = initialize_rag_workflow(llm)
+        self.thread_id = str(uuid.uuid4())
+        self.voice_ratio = voice_ratio
+        self.speak = speak
+
+    def turn(self, query, audio):
+        from src.rag import retrieve, rag_stream
+        from src.tts_stream import StreamingTTS
+        from src.voice_pipeline import start_voice_turn
+
+        timings = {}
+        voice = None
+        start = time.perf_counter()
+        if audio is not None and random.random() < self.voice_ratio:
+            voice_turn = start_voice_turn(audio)
+            query = voice_turn.transcript()
+            timings["stt"] = time.perf_counter() - start
+            voice = {"mode": voice_turn.mode, "speculation": voice_turn.speculation()}
+            stage_start = time.perf_counter()
+            retrieval = voice_turn.retrieval()
+        else:
+            stage_start = time.perf_counter()
+            retrieval = retrieve(query)
+        timings["retrieval"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        tokens, _ = rag_stream(self.thread_id, self.workflow, query, retrieval=retrieval, llm=self.llm)
+        tts = StreamingTTS() if self.speak else None
+        for token in tokens:
+            if tts:
+                tts.feed(token)
+        timings["ttft"] = tokens.ttft
+        timings["llm"] = time.perf_counter() - stage_start
+        if not tokens.text:
+            raise RuntimeError("Empty answer")
+
+        if tts:
+            tts.close()
+            for _ in tts.drain():
+                pass
+            timings["first_audio"] = tts.first_audio
+        timings["turn"] = time.perf_counter() - start
+        return timings, voice
+
+
+def run_level(concurrency, duration, turns_per_session, think_time, llm, voice_ratio, speak, audio):
+    """Run ``concurrency`` sessions for ``duration`` seconds and summarize the turns they completed"""
+    from utils.metrics import LatencyStats
+
+    stats = {stage: LatencyStats(window=100000) for stage in STAGES}
+    counts = {"turns": 0, "errors": 0}
+    errors = {}
+    voice = {"stt_mode": {}, "speculation": {}}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    memory = [(0.0, rss_mb())]
+    done = threading.Event()
+
+    def sample_memory(start):
+        while not done.wait(1.0):
+            memory.append((time.monotonic() - start, rss_mb()))
+
+    def session_loop():
+        session = None
+        turns = 0
+        while time.monotonic() < deadline:
+            if session is None or turns >= turns_per_session:
+                # A returning user opens a new session with a fresh conversation thread
+                session, turns = Session(llm, voice_ratio, speak), 0
+            try:
+                timings, voice_turn = session.turn(random.choice(QUERIES), audio)
+                with lock:
+                    counts["turns"] += 1
+                    if voice_turn:
+                        for key, value in (("stt_mode", voice_turn["mode"]), ("speculation", voice_turn["speculation"])):
+                            voice[key][value] = voice[key].get(value, 0) + 1
+                    for stage, seconds in timings.items():
+                        if seconds is not None:
+                            stats[stage].record(seconds)
+            except Exception as e:
+                with lock:
+                    counts["errors"] += 1
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            turns += 1
+            if think_time:
+                time.sleep(random.uniform(0, 2 * think_time))
+
+    start = time.monotonic()
+    threading.Thread(target=sample_memory, args=(start,), daemon=True).start()
+    threads = [threading.Thread(target=session_loop, name=f"session-{i}") for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    done.set()
+    memory.append((elapsed, rss_mb()))
+
+    attempts = counts["turns"] + counts["errors"]
+    return {
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "turns": counts["turns"],
+        "errors": counts["errors"],
+        "error_rate": counts["errors"] / attempts if attempts else 0.0,
+        "error_types": errors,
+        "turns_per_second": counts["turns"] / elapsed,
+        "stages": {stage: stats[stage].snapshot() for stage in STAGES if stats[stage].count},
+        # A "rest" STT mode means the live endpoint failed and "stt" includes the fallback
+        "voice": voice,
+        "memory_mb": {
+            "start": memory[0][1],
+            "end": memory[-1][1],
+            "peak": max(mb for _, mb in memory),
+            "growth_per_minute": (memory[-1][1] - memory[0][1]) / elapsed * 60,
+        },
+    }
+
+
+def find_saturation(levels, slo, max_error_rate, min_gain=0.1):
+    """Return the highest concurrency that still met the SLO and raised throughput by ``min_gain``"""
+    best = None
+    for level in levels:
+        p95 = level["stages"].get("turn", {}).get("p95_ms", float("inf")) / 1000
+        if p95 > slo or level["error_rate"] > max_error_rate:
+            break
+        if best is not None and level["turns_per_second"] < best["turns_per_second"] * (1 + min_gain):
+            break
+        best = level
+    return best["concurrency"] if best else None
+
+
+def process_stats():
+    from src import context_builder, deepgram_client, embedding_cache, llm_clients, llm_dispatch, vectordb
+    from src.tts_stream import first_audio_stats
+    from src.db_pool import pool
+    from src.checkpointer import get_checkpointer
+    from src.prompt import generation_flight, ttft_stats
+    from src.rag import retrieval_cache, retrieval_flight
+    from src.voice_pipeline import speculation_stats
+
+    checkpointer = get_checkpointer()
+    return {
+        "retrieval_cache": retrieval_cache.stats(),
+        "voice_speculation": dict(speculation_stats),
+        "coalescing": {"retrieval": retrieval_flight.stats(), "generation": generation_flight.stats()},
+        "search": vectordb.search_stats(),
+        "llm_clients": llm_clients.stats(),
+        "llm_providers": llm_dispatch.stats(),
+        "tokens": context_builder.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "tts_first_audio": first_audio_stats.snapshot(),
+        "deepgram": deepgram_client.stats(),
+        "ttft": ttft_stats.snapshot(),
+        "db_pool": pool.stats(),
+        "checkpointer": checkpointer.stats() if hasattr(checkpointer, "stats") else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions (without --sweep)")
+    parser.add_argument("--sweep", type=int, nargs="+", help="run these concurrency levels in turn")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per concurrency level")
+    parser.add_argument("--turns-per-session", type=int, default=5)
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between turns")
+    parser.add_argument("--voice-ratio", type=float, default=0.3, help="fraction of turns asked by voice")
+    parser.add_argument("--no-tts", action="store_true", help="skip speaking the answers")
+    parser.add_argument("--no-retrieval-cache", action="store_true")
+    parser.add_argument("--llm-url", help="OpenAI-compatible base URL (default: start stubs.llm)")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0, help="fraction of LLM requests answered with 429")
+    parser.add_argument("--secondary-llm-latency", type=float,
+                        help="also start an OpenAI stub with this latency as the dispatcher's secondary provider "
+                             "and enable failover and hedging to it")
+    parser.add_argument("--deepgram-url", help="Deepgram base URL (default: start stubs.deepgram)")
+    parser.add_argument("--slo", type=float, default=10.0, help="p95 turn latency in seconds for the saturation point")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    # The clients read their endpoints at import time, so configure them before importing src
+    from stubs import deepgram, llm as llm_stub
+
+    if args.llm_url:
+        llm_url = args.llm_url.rstrip("/")
+    else:
+        server = llm_stub.start_server(latency=args.llm_latency, tokens_per_second=args.llm_tokens_per_second,
+                                       error_rate=args.llm_error_rate, rate_limit_rate=args.llm_rate_limit_rate)
+        llm_url = f"http://127.0.0.1:{server.server_address[1]}"
+    secondary_url = f"{llm_url}/v1"
+    if args.secondary_llm_latency is not None:
+        server = llm_stub.start_server(latency=args.secondary_llm_latency,
+                                       tokens_per_second=args.llm_tokens_per_second)
+        secondary_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ.setdefault("LLM_FAILOVER", "true")
+        os.environ.setdefault("LLM_HEDGING", "true")
+    if args.deepgram_url:
+        deepgram_url = args.deepgram_url
+    else:
+        # Fast speech synthesis keeps simulated playback short
+        server = deepgram.start_server(latency=0.05, chars_per_second=1000.0)
+        deepgram_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["GROQ_BASE_URL"] = llm_url
+    os.environ["OPENAI_BASE_URL"] = secondary_url
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.environ["DG_API_URL"] = deepgram_url
+    os.environ.setdefault("DG_API_KEY", "stub")
+    if args.no_retrieval_cache:
+        os.environ["RETRIEVAL_CACHE_MAX_ENTRIES"] = "0"
+
+    from src.prompt import initialize_llm
+    from src.warmup import start_warmup
+
+    print("Warming up the database and models...")
+    warmup = start_warmup()
+    if not warmup.wait():
+        raise SystemExit(f"Warm-up failed: {warmup.error}")
+
+    llm = initialize_llm("Groq")
+    audio = deepgram.silent_wav(1.0)
+    levels = []
+    for concurrency in args.sweep or [args.sessions]:
+        print(f"Running {concurrency} concurrent sessions for {args.duration:.0f}s...")
+        level = run_level(concurrency, args.duration, args.turns_per_session, args.think_time, llm,
+                          args.voice_ratio, not args.no_tts, audio)
+        levels.append(level)
+        turn = level["stages"].get("turn", {})
+        print(f"{concurrency} sessions: {level['turns_per_second']:.2f} turns/s, "
+              f"p95 turn {turn.get('p95_ms', 0):.0f} ms, error rate {level['error_rate']:.1%}, "
+              f"RSS {level['memory_mb']['end']:.0f} MB")
+
+    report = {
+        "levels": levels,
+        "saturation_concurrency": find_saturation(levels, args.slo, args.max_error_rate),
+        "process": process_stats(),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Base URL of the RAG API (api.py); when set, app.py only renders and forwards to it
+api_url = os.getenv("RAG_API_URL")
+timeout = float(os.getenv("RAG_API_TIMEOUT", "120"))
+
+_client = httpx.Client(base_url=api_url or "http://127.0.0.1:8000", timeout=timeout)
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="api-client")
+
+
+def _events(response):
+    """Parse a server-sent event stream into (event, data) pairs"""
+    event, data = "message", []
+    for line in response.iter_lines():
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif not line and data:
+            yield event, json.loads("\n".join(data))
+            event, data = "message", []
+
+
+class RemoteTokenStream:
+    """Token iterator over the API's SSE answer, with ``ttft`` and ``text`` like prompt.TokenStream"""
+
+    def __init__(self, response, events):
+        self._response = response
+        self._events = events
+        self._start = time.perf_counter()
+        self.ttft = None
+        self.text = ""
+
+    def __iter__(self):
+        try:
+            for event, data in self._events:
+                if event == "token":
+                    if self.ttft is None:
+                        self.ttft = time.perf_counter() - self._start
+                    self.text += data["text"]
+                    yield data["text"]
+                elif event == "error":
+                    raise ValueError(f"Error generating response: {data['message']}")
+                elif event == "done":
+                    break
+        finally:
+            self._response.close()
+
+
+def rag_stream(thread_id, query, llm_choice="Groq", api_key=None, filters=None):
+    """Ask the API; returns ``(tokens, urls)`` like src.rag.rag_stream"""
+    body = {"query": query, "thread_id": thread_id, "llm_choice": llm_choice, "api_key": api_key or None}
+    body.update(filters or {})
+    response = _client.send(_client.build_request("POST", "/rag", json=body), stream=True)
+    if response.is_error:
+        response.read()
+        response.close()
+        raise ValueError(response.json().get("detail", response.text))
+    events = _events(response)
+    # The first event carries the source URLs, sent before the first token
+    _, data = next(events)
+    return RemoteTokenStream(response, events), data["urls"]
+
+
+def text2speech(text):
+    """Synthesize ``text`` through the API and return WAV bytes (None on failure)"""
+    try:
+        response = _client.post("/tts", json={"text": text})
+        response.raise_for_status()
+        return response.content
+
+    except Exception as e:
+        print(f"Exception: {e}")
+
+
+def store_feedback(query, answer, rating):
+    response = _client.post("/feedback", json={"query": query, "response": answer, "rating": rating})
+    response.raise_for_status()
+
+
+class RemoteVoiceTurn:
+    """Transcribes a recording through the API.
+
+    The API speculates on the early transcript and starts retrieval for the final
+    one itself, so ``retrieval`` returns None and the /rag call picks it up there.
+    ``speculation`` is the API's hit, miss or skipped outcome.
+    """
+
+    def __init__(self, audio):
+        self.speculation = None
+        self._transcript = _executor.submit(self._transcribe, bytes(audio))
+
+    def transcript(self, timeout=None):
+        return self._transcript.result(timeout)
+
+    def retrieval(self):
+        return None
+
+    def _transcribe(self, audio):
+        response = _client.post("/stt", content=audio)
+        response.raise_for_status()
+        result = response.json()
+        self.speculation = result.get("speculation")
+        return result["transcript"]
+
+
+def start_voice_turn(audio):
+    return RemoteVoiceTurn(audio)
+
+
+class RemoteWarmup:
+    """Warm-up state of the API, with the attributes app.py reads from WarmupService"""
+
+    def __init__(self):
+        self.state = "pending"
+        self.step = None
+        self.error = None
+
+    @property
+    def ready(self):
+        try:
+            status = _client.get("/health", timeout=5).json()["warmup"]
+            self.state, self.step, self.error = status["state"], status["step"], status["error"]
+        except Exception as e:
+            self.state, self.step, self.error = "pending", "connecting to the API", None
+            print(f"RAG API not reachable: {str(e)}")
+        return self.state == "ready"
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.ready and self.state != "failed":
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(1.0)
+        return self.state == "ready"
+
+
+def start_warmup():
+    return RemoteWarmup()
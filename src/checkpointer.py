@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from langgraph.checkpoint.memory import MemorySaver
+
+load_dotenv()
+
+# "memory" keeps threads in RAM within the limits below; "sqlite" persists them on disk
+backend = os.getenv("CHECKPOINT_BACKEND", "memory")
+sqlite_path = os.getenv("CHECKPOINT_SQLITE_PATH", "checkpoints.sqlite")
+
+max_threads = int(os.getenv("CHECKPOINT_MAX_THREADS", "1000"))
+max_history = int(os.getenv("CHECKPOINT_MAX_HISTORY", "10"))
+max_bytes = int(float(os.getenv("CHECKPOINT_MAX_MB", "256")) * 1024 * 1024)
+idle_ttl = float(os.getenv("CHECKPOINT_IDLE_TTL", "21600"))
+
+
+class BoundedMemorySaver(MemorySaver):
+    """In-memory checkpointer with bounded memory.
+
+    Keeps at most ``max_history`` checkpoints per thread (dropping the channel
+    values only older checkpoints referenced), and evicts least recently used
+    threads once there are more than ``max_threads``, their serialized size
+    exceeds ``max_bytes``, or they have been idle for ``idle_ttl`` seconds.
+    """
+
+    def __init__(self, *, max_threads=max_threads, max_history=max_history, max_bytes=max_bytes, idle_ttl=idle_ttl, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.max_history = max_history
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._lock = threading.RLock()
+        # thread_id -> (last used, serialized bytes), least recently used first
+        self._threads = OrderedDict()
+        self._blob_keys = {}
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def get_tuple(self, config):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id in self._threads:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(self, config, **kwargs):
+        with self._lock:
+            return iter(list(super().list(config, **kwargs)))
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            self._blob_keys.setdefault(thread_id, set()).update(
+                (thread_id, checkpoint_ns, channel, version) for channel, version in new_versions.items()
+            )
+            self._trim_history(thread_id, checkpoint_ns)
+            self._account(thread_id)
+            self._evict(keep=thread_id)
+            return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            thread_id = config["configurable"]["thread_id"]
+            self._account(thread_id)
+            self._evict(keep=thread_id)
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            super().delete_thread(thread_id)
+            _, size = self._threads.pop(thread_id, (0, 0))
+            self.total_bytes -= size
+            self._blob_keys.pop(thread_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"threads": len(self._threads), "bytes": self.total_bytes, "evictions": self.evictions}
+
+    def _touch(self, thread_id):
+        _, size = self._threads[thread_id]
+        self._threads[thread_id] = (time.monotonic(), size)
+        self._threads.move_to_end(thread_id)
+
+    def _trim_history(self, thread_id, checkpoint_ns):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_history:
+            return
+        # Checkpoint ids are time-ordered, so the oldest sort first
+        for checkpoint_id in sorted(checkpoints)[:-self.max_history]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        referenced = set()
+        for saved in checkpoints.values():
+            checkpoint = self.serde.loads_typed(saved[0])
+            referenced.update(
+                (thread_id, checkpoint_ns, channel, version)
+                for channel, version in checkpoint["channel_versions"].items()
+            )
+        blob_keys = self._blob_keys.get(thread_id, set())
+        for key in [key for key in blob_keys if key[1] == checkpoint_ns and key not in referenced]:
+            self.blobs.pop(key, None)
+            blob_keys.discard(key)
+
+    def _account(self, thread_id):
+        size = 0
+        for checkpoint_ns, checkpoints in self.storage[thread_id].items():
+            for checkpoint_id, (checkpoint, metadata, _) in checkpoints.items():
+                size += len(checkpoint[1]) + len(metadata[1])
+                for _, _, value, _ in self.writes.get((thread_id, checkpoint_ns, checkpoint_id), {}).values():
+                    size += len(value[1])
+        for key in self._blob_keys.get(thread_id, ()):
+            blob = self.blobs.get(key)
+            if blob is not None:
+                size += len(blob[1])
+        _, previous = self._threads.pop(thread_id, (0, 0))
+        self.total_bytes += size - previous
+        self._threads[thread_id] = (time.monotonic(), size)
+
+    def _evict(self, keep):
+        now = time.monotonic()
+        for thread_id, (last_used, _) in list(self._threads.items()):
+            if thread_id == keep:
+                continue
+            over_budget = len(self._threads) > self.max_threads or self.total_bytes > self.max_bytes
+            if not over_budget and now - last_used <= self.idle_ttl:
+                break
+            self.delete_thread(thread_id)
+            self.evictions += 1
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def create_checkpointer():
+    """Create the checkpointer selected by CHECKPOINT_BACKEND"""
+    if backend == "sqlite":
+        try:
+            import sqlite3
+            from langgraph.checkpoint.sqlite import SqliteSaver
+        except ImportError:
+            print("langgraph-checkpoint-sqlite is not installed, falling back to in-memory checkpoints")
+        else:
+            conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+            return SqliteSaver(conn)
+    return BoundedMemorySaver()
+
+
+# Backends every worker process can see, with the package that provides each
+SHARED_BACKENDS = {"sqlite": "langgraph-checkpoint-sqlite"}
+
+
+def is_shared():
+    """True when the selected backend is visible to every worker process and installed"""
+    if backend not in SHARED_BACKENDS:
+        return False
+    try:
+        import langgraph.checkpoint.sqlite
+    except ImportError:
+        return False
+    return True
+
+
+def get_checkpointer():
+    """Return the process-wide checkpointer shared by all sessions"""
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            _checkpointer = create_checkpointer()
+        return _checkpointer
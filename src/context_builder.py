@@ -0,0 +1,107 @@
+import os
+import re
+from dotenv import load_dotenv
+from utils import count_tokens as tokenizer
+from utils.count_tokens import count_tokens, truncate_tokens
+from utils.metrics import ValueStats
+
+load_dotenv()
+
+# Tokens of retrieved tweets allowed in the system prompt
+context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Longer tweets are cut to this many tokens, keeping their URL so they can still be cited
+chunk_max_tokens = int(os.getenv("CONTEXT_CHUNK_MAX_TOKENS", "256"))
+# Tweets sharing at least this fraction of their words with a higher-ranked one are dropped
+duplicate_threshold = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.85"))
+# Tokens of each model's context window left free for the answer
+answer_tokens = int(os.getenv("ANSWER_TOKEN_RESERVE", "1024"))
+# Overrides the prompt limit derived from the model's context window
+prompt_token_override = os.getenv("PROMPT_TOKEN_LIMIT")
+
+_url = re.compile(r"(,\s*Tweet URL:\s*\S+|\s*https?://\S+)\s*$")
+
+# Input tokens of every prompt sent to the LLM, and of the context in it
+prompt_tokens = ValueStats()
+context_tokens = ValueStats()
+
+
+def _words(chunk):
+    # Compare the tweet text only, not the date prefix or the URL
+    text = _url.sub("", chunk).split("tweeted:", 1)[-1]
+    return set(re.findall(r"\w+", re.sub(r"https?://\S+", "", text.lower())))
+
+
+def _is_duplicate(words, kept):
+    for other in kept:
+        smaller = min(len(words), len(other))
+        if smaller and len(words & other) / smaller >= duplicate_threshold:
+            return True
+    return False
+
+
+def _truncate(chunk, max_tokens):
+    match = _url.search(chunk)
+    tail = match.group(0) if match else ""
+    body = chunk[:match.start()] if match else chunk
+    return truncate_tokens(body, max(1, max_tokens - count_tokens(tail) - 1)).rstrip() + "…" + tail
+
+
+def build_context(chunks, budget=None, max_chunk_tokens=None):
+    """Pack ranked context chunks into at most ``budget`` tokens.
+
+    Near-duplicate tweets are dropped, overlong ones truncated, and chunks are
+    taken in rank order while they fit. Returns ``(context, report)``.
+    """
+    budget = context_token_budget if budget is None else budget
+    max_chunk_tokens = chunk_max_tokens if max_chunk_tokens is None else max_chunk_tokens
+    kept, kept_words = [], []
+    report = {"chunks": len(chunks), "used": 0, "duplicates": 0, "truncated": 0, "over_budget": 0, "tokens": 0}
+    separator = count_tokens("\n")
+
+    for chunk in chunks:
+        words = _words(chunk)
+        if _is_duplicate(words, kept_words):
+            report["duplicates"] += 1
+            continue
+        tokens = count_tokens(chunk)
+        truncated = tokens > max_chunk_tokens
+        if truncated:
+            chunk = _truncate(chunk, max_chunk_tokens)
+            tokens = count_tokens(chunk)
+        cost = tokens + (separator if kept else 0)
+        if report["tokens"] + cost > budget:
+            if kept:
+                report["over_budget"] += 1
+                continue
+            # Never send an empty context when the best tweet alone is too long
+            chunk = _truncate(chunk, budget)
+            cost = tokens = count_tokens(chunk)
+            truncated = True
+        report["truncated"] += truncated
+        kept.append(chunk)
+        kept_words.append(words)
+        report["tokens"] += cost
+
+    report["used"] = len(kept)
+    context_tokens.record(report["tokens"])
+    return "\n".join(kept), report
+
+
+def prompt_token_limit(model=None):
+    """Most input tokens a prompt for ``model`` may have"""
+    if prompt_token_override:
+        return int(prompt_token_override)
+    return tokenizer.context_window(model) - answer_tokens
+
+
+def record_prompt(tokens):
+    prompt_tokens.record(tokens)
+
+
+def stats():
+    return {
+        "prompt_tokens": prompt_tokens.snapshot(),
+        "context_tokens": context_tokens.snapshot(),
+        # Token counts made with the characters / 4 estimate for lack of a tokenizer
+        "estimated_counts": tokenizer.estimated,
+    }
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from dotenv import load_dotenv
+import lancedb
+from utils.metrics import LatencyStats
+from src import telemetry
+
+load_dotenv()
+
+# How often (seconds) a cached table handle is checked for a newer table version
+refresh_interval = float(os.getenv("LANCEDB_REFRESH_INTERVAL", "5"))
+
+
+class _TableEntry:
+    def __init__(self, table):
+        self.table = table
+        self.version = table.version
+        self.checked_at = time.monotonic()
+
+
+class LanceDBPool:
+    """Process-wide, thread-safe registry of LanceDB connections and table handles.
+
+    Readers always get the currently cached handle without waiting. Once a handle
+    is older than ``refresh_interval`` a background thread opens a fresh one and
+    swaps it in if the table version moved on.
+    """
+
+    def __init__(self, refresh_interval=refresh_interval):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._open_locks = {}
+        self._connections = {}
+        self._tables = {}
+        self._refreshing = set()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.open_latency = LatencyStats()
+
+    def connect(self, db_path):
+        """Return the shared connection for ``db_path``"""
+        with self._lock:
+            conn = self._connections.get(db_path)
+            if conn is None:
+                with telemetry.stage("lancedb_connect"):
+                    conn = lancedb.connect(db_path)
+                self._connections[db_path] = conn
+            return conn
+
+    def open_table(self, table_name, db_path):
+        """Return a cached handle for ``table_name``, opening it on first use"""
+        key = (db_path, table_name)
+        with self._lock:
+            entry = self._tables.get(key)
+            if entry is not None:
+                self.hits += 1
+                if (time.monotonic() - entry.checked_at > self.refresh_interval
+                        and key not in self._refreshing):
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._refresh, args=(key,), daemon=True).start()
+                return entry.table
+            self.misses += 1
+            open_lock = self._open_locks.setdefault(key, threading.Lock())
+
+        # Only one thread opens a given table; the others wait and reuse its handle
+        with open_lock:
+            with self._lock:
+                entry = self._tables.get(key)
+            if entry is not None:
+                return entry.table
+            table = self._open(key)
+            with self._lock:
+                self._tables[key] = _TableEntry(table)
+            return table
+
+    def table_version(self, table_name, db_path):
+        """Return the version of the cached handle for ``table_name``"""
+        self.open_table(table_name, db_path)
+        with self._lock:
+            return self._tables[(db_path, table_name)].version
+
+    def invalidate(self, table_name, db_path):
+        """Drop the cached handle so the next caller reopens the table (after writes or drops)"""
+        with self._lock:
+            self._tables.pop((db_path, table_name), None)
+
+    def stats(self):
+        """Return hit/miss/refresh counters and open latency"""
+        with self._lock:
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "open_tables": len(self._tables),
+            }
+        stats["open_latency"] = self.open_latency.snapshot()
+        return stats
+
+    def _open(self, key):
+        db_path, table_name = key
+        start = time.perf_counter()
+        with telemetry.stage("lancedb_open", table=table_name):
+            table = self.connect(db_path).open_table(table_name)
+        self.open_latency.record(time.perf_counter() - start)
+        return table
+
+    def _refresh(self, key):
+        try:
+            table = self._open(key)
+            with self._lock:
+                entry = self._tables.get(key)
+                if entry is None:
+                    return
+                if table.version != entry.version:
+                    self._tables[key] = _TableEntry(table)
+                    self.refreshes += 1
+                else:
+                    entry.checked_at = time.monotonic()
+        except Exception as e:
+            print(f"Error refreshing LanceDB table {key[1]}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+pool = LanceDBPool()
+
+
+def get_connection(db_path):
+    return pool.connect(db_path)
+
+
+def get_table(table_name, db_path):
+    return pool.open_table(table_name, db_path)
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from urllib.parse import urlencode
+import httpx
+from dotenv import load_dotenv
+from utils.metrics import LatencyStats
+
+load_dotenv()
+
+api_key = os.getenv("DG_API_KEY")
+# Point at a local stub (see stubs/deepgram.py) to run without Deepgram credits
+api_url = os.getenv("DG_API_URL", "https://api.deepgram.com")
+timeout = float(os.getenv("DG_TIMEOUT", "30"))
+max_connections = int(os.getenv("DG_MAX_CONNECTIONS", "20"))
+
+STT_MODEL = "nova-2"
+TTS_MODEL = "aura-helios-en"
+
+# Per-call latency of the transcribe and speak endpoints
+transcribe_latency = LatencyStats()
+transcribe_stream_latency = LatencyStats()
+speak_latency = LatencyStats()
+
+# Bytes per websocket frame when streaming a recorded buffer to the live endpoint
+stream_chunk_size = 8192
+
+_lock = threading.Lock()
+_client = None
+# httpx async clients are bound to the event loop they were created on
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _client_options():
+    return {
+        "base_url": api_url,
+        "headers": {"Authorization": f"Token {api_key}"},
+        "timeout": timeout,
+        "limits": httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    }
+
+
+def get_client():
+    """Return the process-wide keep-alive HTTP client for the Deepgram REST API"""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = httpx.Client(**_client_options())
+        return _client
+
+
+def get_async_client():
+    """Return the keep-alive async HTTP client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(**_client_options())
+        _async_clients[loop] = client
+    return client
+
+
+def _transcribe_request(audio, model, smart_format):
+    params = {"model": model, "smart_format": str(smart_format).lower()}
+    return {"url": "/v1/listen", "params": params, "content": bytes(audio)}
+
+
+def _speak_request(text, model):
+    params = {"model": model, "encoding": "linear16", "container": "wav"}
+    return {"url": "/v1/speak", "params": params, "json": {"text": text}}
+
+
+def _transcript(response):
+    response.raise_for_status()
+    return response.json()["results"]["channels"][0]["alternatives"][0]["transcript"]
+
+
+def transcribe(audio, model=STT_MODEL, smart_format=True):
+    """Transcribe an in-memory audio buffer and return the transcript"""
+    start = time.perf_counter()
+    try:
+        return _transcript(get_client().post(**_transcribe_request(audio, model, smart_format)))
+    finally:
+        transcribe_latency.record(time.perf_counter() - start)
+
+
+async def transcribe_async(audio, model=STT_MODEL, smart_format=True):
+    start = time.perf_counter()
+    try:
+        response = await get_async_client().post(**_transcribe_request(audio, model, smart_format))
+        return _transcript(response)
+    finally:
+        transcribe_latency.record(time.perf_counter() - start)
+
+
+def transcribe_stream(audio, on_update=None, model=STT_MODEL, smart_format=True):
+    """Transcribe a recorded buffer through the live (websocket) endpoint.
+
+    ``on_update(text, is_final)`` is called with the transcript so far whenever
+    Deepgram sends an interim or final result, so callers can act on an early
+    transcript. Returns the final transcript.
+    """
+    from websockets.sync.client import connect
+
+    params = {"model": model, "smart_format": str(smart_format).lower(), "interim_results": "true"}
+    url = f"{api_url.replace('http', 'ws', 1)}/v1/listen?{urlencode(params)}"
+    audio = bytes(audio)
+    finals = []
+
+    start = time.perf_counter()
+    try:
+        with connect(url, additional_headers={"Authorization": f"Token {api_key}"}, open_timeout=timeout) as ws:
+            def send_audio():
+                for offset in range(0, len(audio), stream_chunk_size):
+                    ws.send(audio[offset:offset + stream_chunk_size])
+                ws.send(json.dumps({"type": "CloseStream"}))
+
+            threading.Thread(target=send_audio, daemon=True).start()
+            # Deepgram closes the socket after the last result, which ends the loop
+            for message in ws:
+                if isinstance(message, bytes):
+                    continue
+                result = json.loads(message)
+                if result.get("type") != "Results":
+                    continue
+                text = result["channel"]["alternatives"][0]["transcript"]
+                if result.get("is_final"):
+                    if text:
+                        finals.append(text)
+                    current = " ".join(finals)
+                else:
+                    current = " ".join(finals + [text])
+                if on_update and current:
+                    on_update(current, bool(result.get("is_final")))
+        return " ".join(finals)
+    finally:
+        transcribe_stream_latency.record(time.perf_counter() - start)
+
+
+def speak(text, model=TTS_MODEL):
+    """Synthesize ``text`` and return linear16 WAV bytes"""
+    start = time.perf_counter()
+    try:
+        response = get_client().post(**_speak_request(text, model))
+        response.raise_for_status()
+        return response.content
+    finally:
+        speak_latency.record(time.perf_counter() - start)
+
+
+async def speak_async(text, model=TTS_MODEL):
+    start = time.perf_counter()
+    try:
+        response = await get_async_client().post(**_speak_request(text, model))
+        response.raise_for_status()
+        return response.content
+    finally:
+        speak_latency.record(time.perf_counter() - start)
+
+
+def stats():
+    return {
+        "transcribe": transcribe_latency.snapshot(),
+        "transcribe_stream": transcribe_stream_latency.snapshot(),
+        "speak": speak_latency.snapshot(),
+    }
@@ -0,0 +1,149 @@
+import fcntl
+import hashlib
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# An empty EMBEDDING_CACHE_DIR disables the cache
+cache_dir = os.getenv("EMBEDDING_CACHE_DIR", os.path.join("data", "embedding_cache"))
+max_bytes = int(float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")) * 1024 * 1024)
+# Compaction keeps the newest records up to this fraction of max_bytes
+compact_ratio = 0.5
+
+KEY_BYTES = 16
+
+
+def normalize_text(text):
+    """Collapse whitespace, which the tokenizer ignores anyway"""
+    return " ".join(str(text).split())
+
+
+def cache_key(model_id, text):
+    """Content address of ``text`` embedded by ``model_id``"""
+    return hashlib.blake2b(f"{model_id}\0{normalize_text(text)}".encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """Append-only file of (key, vector) records shared by all processes on the host.
+
+    Readers memory-map the file and index any records appended since their last
+    lookup; writers append under an exclusive ``flock``. Once the file grows past
+    ``max_bytes`` it is compacted to the newest records and atomically replaced,
+    which readers notice through the changed inode.
+    """
+
+    def __init__(self, path, dimensions, max_bytes=max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype([("key", f"V{KEY_BYTES}"), ("vector", "<f4", (dimensions,))])
+        self._lock = threading.Lock()
+        self._records = None
+        self._index = {}
+        self._inode = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compactions = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # flock on a separate file, so writers still serialize after the data file is replaced
+        self._lock_path = f"{path}.lock"
+
+    def get_many(self, keys):
+        """Return the cached vector for each key, or None where there is none"""
+        with self._lock:
+            self._refresh()
+            rows = [self._index.get(key) for key in keys]
+            found = sum(row is not None for row in rows)
+            self.hits += found
+            self.misses += len(rows) - found
+            return [None if row is None else np.array(self._records["vector"][row]) for row in rows]
+
+    def put_many(self, keys, vectors):
+        records = np.zeros(len(keys), dtype=self.dtype)
+        records["key"] = [np.void(key) for key in keys]
+        records["vector"] = vectors
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.path, "ab") as f:
+                    f.write(records.tobytes())
+                self.writes += len(records)
+                if os.path.getsize(self.path) > self.max_bytes:
+                    self._compact()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "compactions": self.compactions,
+            }
+
+    def _refresh(self):
+        """Map the file again if it grew or was replaced, indexing only the new records"""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            self._records, self._index, self._inode = None, {}, None
+            return
+        # Size, inode and mapping all come from this descriptor, even if a compaction replaces the path meanwhile
+        with f:
+            stat = os.fstat(f.fileno())
+            if stat.st_ino != self._inode:
+                self._records, self._index, self._inode = None, {}, stat.st_ino
+            # Ignore a trailing record another process is still writing
+            count = stat.st_size // self.dtype.itemsize
+            known = 0 if self._records is None else len(self._records)
+            if count == known:
+                return
+            self._records = np.memmap(f, dtype=self.dtype, mode="r", shape=(count,))
+        keys = self._records["key"]
+        for row in range(known, count):
+            # Later records win, so a key appended twice resolves to the newest vector
+            self._index[keys[row].tobytes()] = row
+
+    def _compact(self):
+        # Called with the writer lock held
+        records = np.fromfile(self.path, dtype=self.dtype)
+        keep = max(1, int(self.max_bytes * compact_ratio) // self.dtype.itemsize)
+        newest = {}
+        for row in range(len(records) - 1, -1, -1):
+            if len(newest) >= keep:
+                break
+            newest.setdefault(records["key"][row].tobytes(), row)
+        tmp_path = f"{self.path}.tmp"
+        records[sorted(newest.values())].tofile(tmp_path)
+        os.replace(tmp_path, self.path)
+        self.compactions += 1
+        print(f"Compacted embedding cache {self.path}: kept {len(newest)} of {len(records)} records")
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_id, dimensions):
+    """Return the process-wide cache for ``model_id``, or None when caching is disabled"""
+    if not cache_dir:
+        return None
+    with _caches_lock:
+        if model_id not in _caches:
+            file_name = "".join(c if c.isalnum() else "_" for c in model_id)
+            _caches[model_id] = EmbeddingCache(os.path.join(cache_dir, f"{file_name}.{dimensions}.f32"), dimensions)
+        return _caches[model_id]
+
+
+def stats():
+    """Return each model's cache stats"""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {model_id: cache.stats() for model_id, cache in caches.items()}
@@ -0,0 +1,118 @@
+import importlib.util
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from src.embedding_cache import cache_key, get_embedding_cache
+
+load_dotenv()
+
+# "torch" runs the models eagerly in PyTorch; "onnx" runs int8 dynamically quantized
+# ONNX Runtime models, which are faster and smaller on CPU (needs sentence-transformers[onnx])
+inference_backend = os.getenv("INFERENCE_BACKEND", "torch")
+# Quantized ONNX file variant: arm64, avx2, avx512 or avx512_vnni
+onnx_quantization = os.getenv("ONNX_QUANTIZATION", "avx2")
+# Where locally quantized models are stored when the hub has no prebuilt file
+onnx_cache_dir = os.getenv("ONNX_CACHE_DIR", os.path.join("data", "onnx"))
+encode_batch_size = int(os.getenv("ENCODE_BATCH_SIZE", "32"))
+
+embedding_model_name = "sentence-transformers/all-mpnet-base-v2"
+embedding_dimensions = 768
+cross_encoder_model_name = "cross-encoder/ms-marco-MiniLM-L-2-v2"
+
+_models = {}
+_lock = threading.Lock()
+
+
+def onnx_file_name(quantization=None):
+    """Path of the int8 ONNX variant inside a model repo; avx2 kernels use unsigned int8 weights"""
+    quantization = quantization or onnx_quantization
+    weights = "quint8" if quantization == "avx2" else "qint8"
+    return f"onnx/model_{weights}_{quantization}.onnx"
+
+
+def _load(model_class, model_name, backend):
+    if backend == "onnx" and not (importlib.util.find_spec("onnxruntime") and importlib.util.find_spec("optimum")):
+        print("optimum[onnxruntime] is not installed, falling back to the torch backend")
+        backend = "torch"
+    if backend != "onnx":
+        return model_class(model_name, device="cpu")
+
+    file_name = onnx_file_name()
+    try:
+        return model_class(model_name, backend="onnx", model_kwargs={"file_name": file_name})
+    except Exception as e:
+        print(f"No prebuilt {file_name} for {model_name} ({str(e)}), quantizing locally...")
+
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    local_path = os.path.join(onnx_cache_dir, model_name.replace("/", "__"))
+    if not os.path.exists(os.path.join(local_path, file_name)):
+        # Export the fp32 ONNX graph, then write the int8 variant next to it
+        model = model_class(model_name, backend="onnx")
+        model.save_pretrained(local_path)
+        export_dynamic_quantized_onnx_model(model, onnx_quantization, local_path)
+    return model_class(local_path, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def _get(kind, model_class, model_name, backend):
+    key = (kind, backend)
+    with _lock:
+        if key not in _models:
+            print(f"Loading {model_name} with the {backend} backend...")
+            _models[key] = _load(model_class, model_name, backend)
+        return _models[key]
+
+
+def get_embedder(backend=None):
+    """Return the process-wide sentence embedding model for ``backend`` (default INFERENCE_BACKEND)"""
+    from sentence_transformers import SentenceTransformer
+    return _get("embedder", SentenceTransformer, embedding_model_name, backend or inference_backend)
+
+
+def get_cross_encoder(backend=None):
+    """Return the process-wide cross-encoder for ``backend`` (default INFERENCE_BACKEND)"""
+    from sentence_transformers import CrossEncoder
+    return _get("cross-encoder", CrossEncoder, cross_encoder_model_name, backend or inference_backend)
+
+
+def embed_texts(texts, backend=None, batch_size=encode_batch_size, cache=True):
+    """Embed texts into unit-length float32 vectors, shape (len(texts), embedding_dimensions).
+
+    Texts already in the on-disk embedding cache are not encoded again.
+    """
+    texts = list(texts)
+    backend = backend or inference_backend
+    model_id = f"{embedding_model_name}:{backend}"
+    embedding_cache = get_embedding_cache(model_id, embedding_dimensions) if cache else None
+    if embedding_cache is None:
+        return _encode(texts, backend, batch_size)
+
+    keys = [cache_key(model_id, text) for text in texts]
+    vectors = embedding_cache.get_many(keys)
+    missing = {}
+    for i, (key, vector) in enumerate(zip(keys, vectors)):
+        if vector is None:
+            missing.setdefault(key, []).append(i)
+    if missing:
+        encoded = _encode([texts[rows[0]] for rows in missing.values()], backend, batch_size)
+        embedding_cache.put_many(list(missing), encoded)
+        for rows, vector in zip(missing.values(), encoded):
+            for i in rows:
+                vectors[i] = vector
+    return np.stack(vectors).astype(np.float32) if vectors else np.empty((0, embedding_dimensions), dtype=np.float32)
+
+
+def _encode(texts, backend, batch_size):
+    return get_embedder(backend).encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+
+
+def rerank_scores(pairs, backend=None, batch_size=encode_batch_size):
+    """Score (query, passage) pairs with the cross-encoder; higher is more relevant"""
+    return get_cross_encoder(backend).predict(list(pairs), batch_size=batch_size, show_progress_bar=False)
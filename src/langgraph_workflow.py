@@ -1,19 +1,55 @@
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, RemoveMessage
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import MessagesState, StateGraph, START, END
-from typing import Literal
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from src.checkpointer import get_checkpointer
+from src import telemetry
+from src.context_builder import prompt_token_limit, record_prompt
+from utils.count_tokens import context_window, count_message_tokens
+
+load_dotenv()
+
+# Conversations are summarized once their messages exceed this many tokens
+summary_token_budget = int(os.getenv("SUMMARY_TOKEN_BUDGET", "1500"))
+_summary_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SUMMARY_WORKERS", "2")), thread_name_prefix="summary")
+
+_locks_guard = threading.Lock()
+# A thread's lock lives as long as someone holds it or is about to acquire it
+_thread_locks = weakref.WeakValueDictionary()
+_pending_summaries = set()
+
+def _models(llm):
+    """Names of the models ``llm`` may send a prompt to; a dispatcher sends it to any of its providers"""
+    providers = getattr(llm, "providers", None)
+    if providers:
+        return [name for provider in providers for name in _models(provider.llm)]
+    name = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    return [name] if isinstance(name, str) else []
+
+def prompt_model(llm):
+    """The model whose tokenizer and limit the prompt must fit: the one with the smallest context window"""
+    return min(_models(llm), key=context_window, default=None)
 
 class State(MessagesState):
     """Enhanced state class with summary and context management"""
     summary: str
     context: str
 
-def initialize_rag_workflow(llm):
-    """Create a RAG workflow with LangGraph memory management"""
-    memory = MemorySaver()
+def initialize_rag_workflow(llm=None):
+    """Create a RAG workflow with LangGraph memory management.
+
+    The chat model is taken from ``config["configurable"]["llm"]`` on every
+    invocation, so the workflow follows the user's current LLM choice; ``llm``
+    is only the fallback when none is passed.
+    """
+    memory = get_checkpointer()
     workflow = StateGraph(State)
     
-    def call_model(state: State):
+    def call_model(state: State, config: RunnableConfig):
         summary = state.get("summary", "")
         context = state.get("context", "")
         
@@ -34,19 +70,73 @@ def initialize_rag_workflow(llm):
         - Always respond in this manner, Response format: [Your response]. [source](Tweet URL)
         """
         
-        messages = [SystemMessage(content=system_prompt)] + state["messages"]
-        response = llm.invoke(messages)
+        current_llm = config.get("configurable", {}).get("llm") or llm
+        model = prompt_model(current_llm)
+        history = list(state["messages"])
+        input_tokens = count_message_tokens([SystemMessage(content=system_prompt)] + history, model)
+        # Leave the oldest turns out of this prompt (not the thread) if it would not fit the model
+        limit = prompt_token_limit(model)
+        while input_tokens > limit and len(history) > 1:
+            input_tokens -= count_message_tokens(history[:1], model)
+            history = history[1:]
+        record_prompt(input_tokens)
+        telemetry.count("llm.input_tokens", input_tokens)
+
+        messages = [SystemMessage(content=system_prompt)] + history
+        response = current_llm.invoke(messages)
         return {"messages": [response]}
         
-    def should_continue(state: State) -> Literal["summarize_conversation", END]:
-        """Determine if conversation should continue or be summarized"""
-        messages = state["messages"]
-        if len(messages) > 6:  # Summarize after 6 messages
-            return "summarize_conversation"
-        return END
-
-    def summarize_conversation(state: State):
-        """Generate conversation summary"""
+    # Define nodes and edges
+    workflow.add_node("conversation", call_model)
+    # Set entry point
+    workflow.add_edge(START, "conversation")
+    # Summarization runs in the background after the answer, see schedule_summary
+    workflow.add_edge("conversation", END)
+    return workflow.compile(checkpointer=memory)
+
+class _ThreadLock:
+    """threading.Lock that can be weakly referenced"""
+
+    __slots__ = ("_lock", "__weakref__")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._lock.release()
+        return False
+
+    def locked(self):
+        return self._lock.locked()
+
+def thread_lock(thread_id):
+    """Return the lock serializing writes to a conversation thread"""
+    with _locks_guard:
+        lock = _thread_locks.get(thread_id)
+        if lock is None:
+            lock = _thread_locks[thread_id] = _ThreadLock()
+        return lock
+
+def schedule_summary(workflow, llm, thread_id):
+    """Summarize the thread in the background once its messages exceed the token budget"""
+    with _locks_guard:
+        if thread_id in _pending_summaries:
+            return
+        _pending_summaries.add(thread_id)
+    _summary_executor.submit(_summarize_thread, workflow, llm, thread_id)
+
+def _summarize_thread(workflow, llm, thread_id):
+    config = {"configurable": {"thread_id": thread_id}}
+    try:
+        state = workflow.get_state(config).values
+        messages = state.get("messages", [])
+        if len(messages) <= 2 or count_message_tokens(messages) <= summary_token_budget:
+            return
+
         summary = state.get("summary", "")
         if summary:
             summary_prompt = (
@@ -59,26 +149,23 @@ def initialize_rag_workflow(llm):
                 "Include as many specific details as you can:"
             )
 
-        messages = state["messages"] + [HumanMessage(content=summary_prompt)]
-        response = llm.invoke(messages)
-        # Keep last two messages for context
-        delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-2]]
-        return {
-            "summary": response.content,
-            "messages": delete_messages
-        }
-
-    # Define nodes and edges
-    workflow.add_node("conversation", call_model)
-    workflow.add_node("summarize_conversation", summarize_conversation)
-    # Set entry point
-    workflow.add_edge(START, "conversation")
-    # Add conditional edge for summarization
-    workflow.add_conditional_edges(
-        "conversation",
-        should_continue,
-    )
-    # Add edge from summarization to end
-    workflow.add_edge("summarize_conversation", END)
-    return workflow.compile(checkpointer=memory)
+        # The LLM call runs without the thread lock, so a new turn is never held up by it
+        with telemetry.stage("summarize", messages=len(messages)):
+            response = llm.invoke(messages + [HumanMessage(content=summary_prompt)])
 
+        with thread_lock(thread_id):
+            # A turn may have finished meanwhile; only drop messages that were summarized and still exist
+            current = workflow.get_state(config).values
+            present = {m.id for m in current.get("messages", [])}
+            # Keep last two messages for context
+            delete_messages = [RemoveMessage(id=m.id) for m in messages[:-2] if m.id in present]
+            workflow.update_state(
+                config,
+                {"summary": response.content, "messages": delete_messages},
+                as_node="conversation",
+            )
+    except Exception as e:
+        print(f"Error summarizing conversation {thread_id}: {str(e)}")
+    finally:
+        with _locks_guard:
+            _pending_summaries.discard(thread_id)
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import httpx
+from dotenv import load_dotenv
+from langchain_groq import ChatGroq
+from langchain_openai import ChatOpenAI
+
+load_dotenv()
+
+# Clients unused for this many seconds are dropped from the cache
+idle_ttl = float(os.getenv("LLM_CLIENT_IDLE_TTL", "1800"))
+max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+# Seconds to connect, and to wait for each chunk of a response, before the request fails
+connect_timeout = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+read_timeout = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+# Point a provider at another OpenAI-compatible endpoint, e.g. the local stub in stubs/llm.py
+groq_base_url = os.getenv("GROQ_BASE_URL") or None
+openai_base_url = os.getenv("OPENAI_BASE_URL") or None
+
+MODELS = {
+    "Groq": "llama3-8b-8192",
+    "OpenAI": "gpt-3.5-turbo",
+}
+
+# One connection pool shared by every cached client, whatever the provider or key
+_limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+_timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+http_client = httpx.Client(limits=_limits, timeout=_timeout)
+http_async_client = httpx.AsyncClient(limits=_limits, timeout=_timeout)
+
+_lock = threading.Lock()
+# (provider, model, hashed api key, max retries) -> [client, last used]
+_clients = OrderedDict()
+hits = 0
+misses = 0
+
+
+def _build(provider, model, api_key, max_retries):
+    if provider == "Groq":
+        return ChatGroq(
+            api_key=api_key,
+            model=model,
+            temperature=0,
+            max_tokens=None,
+            timeout=_timeout,
+            max_retries=max_retries,
+            streaming=True,
+            base_url=groq_base_url,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+    if provider == "OpenAI":
+        return ChatOpenAI(
+            api_key=api_key,
+            model=model,
+            temperature=0,
+            max_tokens=None,
+            timeout=_timeout,
+            max_retries=max_retries,
+            streaming=True,
+            base_url=openai_base_url,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+def get_llm(provider, api_key, model=None, max_retries=2):
+    """Return a cached chat model for (provider, model, api key, retries), building it on first use"""
+    global hits, misses
+    model = model or MODELS[provider]
+    # Only a hash of the key is kept in the cache key
+    key = (provider, model, hashlib.sha256((api_key or "").encode()).hexdigest(), max_retries)
+    now = time.monotonic()
+    with _lock:
+        for stale_key in [k for k, (_, last_used) in _clients.items() if now - last_used > idle_ttl]:
+            del _clients[stale_key]
+        entry = _clients.get(key)
+        if entry is not None:
+            hits += 1
+            entry[1] = now
+            _clients.move_to_end(key)
+            return entry[0]
+        misses += 1
+        client = _build(provider, model, api_key, max_retries)
+        _clients[key] = [client, now]
+        return client
+
+
+def stats():
+    with _lock:
+        return {"clients": len(_clients), "hits": hits, "misses": misses}
@@ -0,0 +1,343 @@
+"""Hedged, failover LLM dispatch across Groq and OpenAI.
+
+``HedgedChatModel`` streams from the first healthy provider. Other providers
+are only added with LLM_FAILOVER, since they are called with the server's keys.
+With LLM_HEDGING, if no token has arrived after the primary's usual first-token
+latency (LLM_HEDGE_PERCENTILE of its recent calls), the same request also goes
+to the next provider and whichever streams first wins; the other call is dropped. Providers that keep failing are
+skipped for a cool-down (circuit breaker), rate-limited ones for their
+Retry-After, and every call is bounded by first-token, stall and total timeouts.
+A provider with nothing to fail over to is never skipped; its client retries
+errors and rate limits itself instead.
+"""
+import hashlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.outputs import ChatGenerationChunk
+from src.llm_clients import MODELS, get_llm, idle_ttl
+from src import telemetry
+from utils.metrics import LatencyStats
+
+load_dotenv()
+
+enabled = os.getenv("LLM_DISPATCH", "true").lower() in ("1", "true", "yes")
+# Fall back to the other providers on the server's keys; never for callers who brought their own key
+failover = os.getenv("LLM_FAILOVER", "false").lower() in ("1", "true", "yes")
+# Also send slow requests to the next provider, paying for both calls
+hedging = os.getenv("LLM_HEDGING", "false").lower() in ("1", "true", "yes")
+# Hedge once the primary is slower than this percentile of its recent first-token latencies
+hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Used until a provider has hedge_min_samples latencies, and as a floor afterwards
+default_hedge_delay = float(os.getenv("LLM_HEDGE_DELAY", "2.0"))
+hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.25"))
+hedge_min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Tail-latency caps for the whole dispatch
+first_token_timeout = float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "15"))
+stall_timeout = float(os.getenv("LLM_STALL_TIMEOUT", "10"))
+total_timeout = float(os.getenv("LLM_TOTAL_TIMEOUT", "60"))
+# Circuit breaker: open after this many consecutive failures, probe again after the cool-down
+breaker_failures = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+breaker_cooldown = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+# Backoff after a 429 without Retry-After, doubled per consecutive rate limit
+rate_limit_backoff = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", "1.0"))
+rate_limit_max_backoff = float(os.getenv("LLM_RATE_LIMIT_MAX_BACKOFF", "60"))
+
+default_keys = {
+    "Groq": os.getenv("GROQ_API_KEY"),
+    "OpenAI": os.getenv("OPENAI_API_KEY"),
+}
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_DISPATCH_WORKERS", "64")),
+                               thread_name_prefix="llm-dispatch")
+_lock = threading.Lock()
+# Keyed by a hash of each API key and dropped after LLM_CLIENT_IDLE_TTL unused, like the clients
+_providers = {}
+# Provider keys -> [dispatcher, last used]
+_dispatchers = {}
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Provider:
+    """One LLM endpoint with its first-token latencies, circuit breaker and rate-limit backoff"""
+
+    def __init__(self, name, llm, skippable=True):
+        self.name = name
+        self.llm = llm
+        # Whether errors and rate limits may take the provider out of rotation for a while
+        self.skippable = skippable
+        self.last_used = time.monotonic()
+        self.ttft = LatencyStats(window=256)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._rate_limits = 0
+        self._blocked_until = 0.0
+        self._probing = False
+        self.counts = {"calls": 0, "hedges": 0, "wins": 0, "errors": 0, "rate_limited": 0, "cancelled": 0}
+
+    def acquire(self, hedge):
+        """Claim a call if the provider is neither cooling down nor already probing a half-open circuit"""
+        with self._lock:
+            if time.monotonic() < self._blocked_until:
+                return False
+            if self._failures >= breaker_failures:
+                if self._probing:
+                    return False
+                self._probing = True
+            self.counts["calls"] += 1
+            if hedge:
+                self.counts["hedges"] += 1
+            return True
+
+    def hedge_delay(self):
+        if self.ttft.count < hedge_min_samples:
+            return default_hedge_delay
+        return max(hedge_min_delay, self.ttft.percentile(hedge_percentile))
+
+    def succeeded(self):
+        with self._lock:
+            self._failures = 0
+            self._rate_limits = 0
+            self._probing = False
+
+    def won(self):
+        with self._lock:
+            self.counts["wins"] += 1
+
+    def cancelled(self):
+        with self._lock:
+            self._probing = False
+            self.counts["cancelled"] += 1
+
+    def failed(self, error):
+        with self._lock:
+            self._probing = False
+            self.counts["errors"] += 1
+            rate_limited = _status_code(error) == 429
+            if rate_limited:
+                self.counts["rate_limited"] += 1
+            if not self.skippable:
+                # Its client has already retried; blocking it would fail every turn without calling it
+                return
+            if rate_limited:
+                self._rate_limits += 1
+                backoff = _retry_after(error)
+                if backoff is None:
+                    backoff = min(rate_limit_max_backoff, rate_limit_backoff * 2 ** (self._rate_limits - 1))
+                self._blocked_until = time.monotonic() + backoff
+                print(f"{self.name} rate limited, backing off for {backoff:.1f}s")
+                return
+            self._failures += 1
+            if self._failures >= breaker_failures:
+                self._blocked_until = time.monotonic() + breaker_cooldown
+                print(f"{self.name} failed {self._failures} times in a row, circuit open for {breaker_cooldown:.0f}s")
+
+    def state(self):
+        with self._lock:
+            if time.monotonic() < self._blocked_until:
+                return "rate_limited" if self._failures < breaker_failures else "open"
+            return "half_open" if self._failures >= breaker_failures else "closed"
+
+    def stats(self):
+        return {"state": self.state(), **self.counts, "ttft": self.ttft.snapshot(), "hedge_delay": self.hedge_delay()}
+
+
+def _call(provider, messages, stop, kwargs, events, cancel):
+    """Stream one provider's answer into ``events`` until done, failed or cancelled"""
+    start = time.monotonic()
+    first = True
+    try:
+        for chunk in provider.llm.stream(messages, stop=stop, **kwargs):
+            if cancel.is_set():
+                if first:
+                    # A lower bound of its latency, so hedging does not make the primary look faster than it is
+                    provider.ttft.record(time.monotonic() - start)
+                provider.cancelled()
+                return
+            if first:
+                provider.ttft.record(time.monotonic() - start)
+                first = False
+            events.put(("chunk", provider, ChatGenerationChunk(message=chunk)))
+        provider.succeeded()
+        events.put(("done", provider, None))
+    except Exception as e:
+        if cancel.is_set():
+            provider.cancelled()
+            return
+        provider.failed(e)
+        telemetry.count("llm.dispatch.errors", provider=provider.name, status=str(_status_code(e)))
+        events.put(("error", provider, e))
+
+
+class HedgedChatModel(BaseChatModel):
+    """Chat model that streams from the first healthy provider and hedges to the next one when it is slow"""
+
+    providers: List[Any]
+
+    @property
+    def _llm_type(self):
+        return "hedged-dispatch"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return generate_from_stream(self._stream(messages, stop=stop, **kwargs))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        events = queue.Queue()
+        start = time.monotonic()
+        waiting = list(self.providers)
+        running = {}
+        errors = []
+
+        def launch(hedge):
+            while waiting:
+                provider = waiting.pop(0)
+                if provider.acquire(hedge):
+                    cancel = threading.Event()
+                    running[provider] = cancel
+                    _executor.submit(telemetry.propagate(_call), provider, messages, stop, kwargs, events, cancel)
+                    return provider
+            return None
+
+        def unavailable():
+            states = ", ".join(f"{p.name}: {p.state()}" for p in self.providers)
+            reasons = "; ".join(f"{p.name}: {e}" for p, e in errors)
+            return RuntimeError(f"No LLM provider available ({states}){f' - {reasons}' if reasons else ''}")
+
+        winner = None
+        try:
+            primary = launch(hedge=False)
+            if primary is None:
+                raise unavailable()
+            hedge_at = start + primary.hedge_delay() if hedging else float("inf")
+            first_token_deadline = start + first_token_timeout
+
+            while winner is None:
+                now = time.monotonic()
+                if now >= first_token_deadline:
+                    raise TimeoutError(f"No LLM provider answered within {first_token_timeout:.0f}s")
+                wait_until = min(first_token_deadline, hedge_at if waiting else float("inf"))
+                try:
+                    kind, provider, payload = events.get(timeout=max(0.0, wait_until - now))
+                except queue.Empty:
+                    if waiting and time.monotonic() >= hedge_at:
+                        hedge_at = float("inf")
+                        hedged = launch(hedge=True)
+                        if hedged is not None:
+                            print(f"{primary.name} slower than {primary.hedge_delay():.2f}s, hedging to {hedged.name}")
+                            telemetry.count("llm.dispatch.hedges", primary=primary.name, secondary=hedged.name)
+                    continue
+
+                if kind == "error":
+                    errors.append((provider, payload))
+                    del running[provider]
+                    # Fail over at once rather than waiting for the hedge delay
+                    if not running and launch(hedge=False) is None:
+                        # A lone provider's own error says more than "no provider available"
+                        raise payload if len(self.providers) == 1 else unavailable()
+                    continue
+                winner = provider
+                for other, cancel in running.items():
+                    if other is not winner:
+                        cancel.set()
+                winner.won()
+                telemetry.count("llm.dispatch.wins", provider=winner.name, hedged=len(running) > 1)
+                if kind == "done":
+                    return
+                yield payload
+
+            deadline = start + total_timeout
+            while True:
+                remaining = min(stall_timeout, deadline - time.monotonic())
+                if remaining <= 0:
+                    raise TimeoutError(f"{winner.name} answer exceeded {total_timeout:.0f}s")
+                try:
+                    kind, provider, payload = events.get(timeout=remaining)
+                except queue.Empty:
+                    raise TimeoutError(f"{winner.name} stream stalled for {remaining:.0f}s")
+                if provider is not winner:
+                    continue
+                if kind == "done":
+                    return
+                if kind == "error":
+                    # Tokens were already streamed, so a failover would repeat the answer
+                    raise payload
+                yield payload
+        finally:
+            for cancel in running.values():
+                cancel.set()
+
+
+def _provider(key, api_key, now):
+    """Return the provider for ``key``, building it on first use; called with ``_lock`` held"""
+    provider = _providers.get(key)
+    if provider is None:
+        name, _, _, skippable = key
+        if skippable:
+            # Retries are left to the dispatcher, so rate limits and errors fail over immediately
+            llm = get_llm(name, api_key, max_retries=0)
+        else:
+            # Nothing to fail over to, so the client retries with backoff, honouring Retry-After
+            llm = get_llm(name, api_key)
+        provider = _providers[key] = Provider(name, llm, skippable=skippable)
+    provider.last_used = now
+    return provider
+
+
+def _evict(now):
+    for key in [key for key, provider in _providers.items() if now - provider.last_used > idle_ttl]:
+        del _providers[key]
+    for key in [key for key, (_, last_used) in _dispatchers.items() if now - last_used > idle_ttl]:
+        del _dispatchers[key]
+
+
+def get_dispatcher(primary, api_key, own_key=False):
+    """Return the dispatcher for ``primary``, followed by the other server-keyed providers with LLM_FAILOVER.
+
+    ``own_key`` marks a key the caller supplied; their requests then only go to that provider,
+    so the operator does not pay for them.
+    """
+    if not api_key:
+        raise ValueError(f"No API key for {primary}")
+    names = [primary]
+    if failover and not own_key:
+        names += [name for name in MODELS if name != primary and default_keys.get(name)]
+    skippable = len(names) > 1
+    # Provider cache key -> the API key it calls with
+    keys = {}
+    for name in names:
+        key = api_key if name == primary else default_keys[name]
+        keys[(name, MODELS[name], hashlib.sha256(key.encode()).hexdigest(), skippable)] = key
+    now = time.monotonic()
+    with _lock:
+        _evict(now)
+        providers = [_provider(cache_key, key, now) for cache_key, key in keys.items()]
+        entry = _dispatchers.get(tuple(keys))
+        if entry is None:
+            entry = _dispatchers[tuple(keys)] = [HedgedChatModel(providers=providers), now]
+        entry[1] = now
+        return entry[0]
+
+
+def stats():
+    with _lock:
+        providers = list(_providers.values())
+    return [{"provider": provider.name, **provider.stats()} for provider in providers]
@@ -1,20 +1,25 @@
+import hashlib
 import openlit
 import os
+import time
 from dotenv import load_dotenv
-from groq import Groq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, RemoveMessage
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.graph import MessagesState, StateGraph, START, END
-import streamlit as st
-from typing import Literal, Dict, Any, Optional, Tuple, List
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
+from langgraph.graph import MessagesState
+from utils.metrics import LatencyStats
+from src.langgraph_workflow import thread_lock, schedule_summary
+from src.llm_clients import get_llm
+from src import llm_dispatch
+from src.retrieval_cache import normalize_query
+from src.singleflight import SingleFlight
 
 openlit.init()
 load_dotenv()
 
+# Share one LLM generation between new conversations asking the same question with the same context.
+# Off by default: every user then gets the same wording, where separate calls would vary.
+share_generations = os.getenv("SHARE_LLM_GENERATIONS", "false").lower() in ("1", "true", "yes")
+generation_flight = SingleFlight("generation")
+
 class State(MessagesState):
     """Enhanced state class with summary and context management"""
     summary: str
@@ -23,39 +28,20 @@ class State(MessagesState):
 # Load default Groq API key
 default_groq_api = os.getenv("GROQ_API_KEY")
 
-# Default Groq LLM setup
-default_llm = ChatGroq(
-    api_key=default_groq_api,
-    model="llama3-8b-8192",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    stream=False,
-)
-
 def initialize_llm(choice, api_key=None):
-    """Initialize the LLM based on user choice."""
-    if choice == "Groq" and api_key:
-        return ChatGroq(
-            api_key=api_key,
-            model="llama3-8b-8192",
-            temperature=0,
-            max_tokens=None,
-            timeout=None,
-            max_retries=2,
-            stream=True,
-        )
-    elif choice == "OpenAI" and api_key:
-        return ChatOpenAI(
-            api_key=api_key,
-            model="gpt-3.5-turbo",
-            temperature=0,
-            max_tokens=None,
-            stream=True,
-        )
+    """Return the (cached) LLM for the user's choice, or the default Groq LLM without a key.
+
+    With LLM_DISPATCH enabled this is a dispatcher with timeouts and a circuit breaker, which
+    fails over (LLM_FAILOVER) and hedges (LLM_HEDGING) to the other provider on the server's keys.
+    """
+    own_key = choice in ("Groq", "OpenAI") and bool(api_key)
+    if own_key:
+        provider = choice
     else:
-        return default_llm
+        provider, api_key = "Groq", default_groq_api
+    if llm_dispatch.enabled:
+        return llm_dispatch.get_dispatcher(provider, api_key, own_key=own_key)
+    return get_llm(provider, api_key)
 
 def ask_llm(thread_id_state, langgraph_workflow_state, query, context, llm_choice="Groq", api_key=None):
     """Main function to process queries with LangGraph memory"""
@@ -72,11 +58,13 @@ def ask_llm(thread_id_state, langgraph_workflow_state, query, context, llm_choic
             "context": context,
         }
         
-        # Process through workflow
-        config = {"configurable": {"thread_id": thread_id_state}}
+        # Process through workflow; the workflow answers with the LLM passed in the config
+        config = {"configurable": {"thread_id": thread_id_state, "llm": current_llm}}
         
         # Execute workflow and get final state
-        final_state = langgraph_workflow_state.invoke(input_state, config)
+        with thread_lock(thread_id_state):
+            final_state = langgraph_workflow_state.invoke(input_state, config)
+        schedule_summary(langgraph_workflow_state, current_llm, thread_id_state)
         
         # Extract the last AI message
         messages = final_state["messages"]
@@ -91,4 +79,89 @@ def ask_llm(thread_id_state, langgraph_workflow_state, query, context, llm_choic
         
     except Exception as e:
         print(f"Error generating response: {str(e)}")
-        raise ValueError(f"Error generating response: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Error generating response: {str(e)}")
+
+# Time to first token across all streamed answers
+ttft_stats = LatencyStats()
+
+class TokenStream:
+    """Iterator over answer tokens that records time to first token and the full text"""
+
+    def __init__(self, tokens):
+        self._tokens = tokens
+        self._start = time.perf_counter()
+        self.ttft = None
+        self.text = ""
+
+    def __iter__(self):
+        for token in self._tokens:
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self._start
+                ttft_stats.record(self.ttft)
+                print(f"Time to first token: {self.ttft * 1000:.0f} ms")
+            self.text += token
+            yield token
+
+def ask_llm_stream(thread_id_state, langgraph_workflow_state, query, context, llm=None):
+    """Stream the answer of the LangGraph workflow token by token as the LLM produces it.
+
+    Once the answer is complete the conversation is summarized in the background with ``llm``.
+    """
+    input_state = {
+        "messages": [HumanMessage(content=query)],
+        "context": context,
+    }
+    llm = llm or initialize_llm("Groq")
+    config = {"configurable": {"thread_id": thread_id_state, "llm": llm}}
+
+    def tokens():
+        try:
+            with thread_lock(thread_id_state):
+                for chunk, metadata in langgraph_workflow_state.stream(input_state, config, stream_mode="messages"):
+                    if metadata.get("langgraph_node") != "conversation":
+                        continue
+                    if isinstance(chunk, (AIMessageChunk, AIMessage)) and chunk.content:
+                        yield chunk.content
+            schedule_summary(langgraph_workflow_state, llm, thread_id_state)
+        except Exception as e:
+            print(f"Error generating response: {str(e)}")
+            raise ValueError(f"Error generating response: {str(e)}")
+
+    if share_generations and _is_new_thread(langgraph_workflow_state, config):
+        # Without history the answer depends only on the model, the question and the context
+        key = (id(llm), normalize_query(query), hashlib.blake2b(context.encode("utf-8"), digest_size=16).digest())
+        shared, leader = generation_flight.share(key, tokens)
+        if not leader:
+            return TokenStream(_follow(shared, tokens, langgraph_workflow_state, config, input_state))
+        return TokenStream(iter(shared))
+
+    return TokenStream(tokens())
+
+def _is_new_thread(workflow, config):
+    return not workflow.get_state(config).values.get("messages")
+
+def _follow(shared, generate, workflow, config, input_state):
+    """Stream another thread's answer, then record the turn in this thread as if it had been generated here.
+
+    If that answer was abandoned before this thread joined, ``generate`` answers (and records) here instead.
+    """
+    regenerated = False
+
+    def regenerate():
+        nonlocal regenerated
+        regenerated = True
+        yield from generate()
+
+    text = ""
+    for token in shared.join(regenerate):
+        text += token
+        yield token
+    if regenerated:
+        return
+    thread_id = config["configurable"]["thread_id"]
+    with thread_lock(thread_id):
+        workflow.update_state(
+            config,
+            {"messages": input_state["messages"] + [AIMessage(content=text)], "context": input_state["context"]},
+            as_node="conversation",
+        )
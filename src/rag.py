@@ -1,10 +1,70 @@
-from src.vectordb import lancedb_hybrid_search
-from src.prompt import ask_llm
+from src.vectordb import lancedb_hybrid_search, embed_queries, build_filter, db_path, table_name
+from src.prompt import ask_llm, ask_llm_stream
+from src.db_pool import pool
+from src.retrieval_cache import SemanticCache, normalize_query
+from src.singleflight import SingleFlight
+from src.context_builder import build_context
+from src import telemetry
+
+retrieval_cache = SemanticCache()
+# Identical queries arriving while one is being retrieved wait for its result instead of searching again
+retrieval_flight = SingleFlight("retrieval")
+
+def retrieve(query, k=5, start_date=None, end_date=None, username=None):
+    """Hybrid search with a semantic cache in front of the encoder and reranker"""
+    # Results are only shared between queries with the same k and filters
+    namespace = f"k={k};where={build_filter(start_date, end_date, username)}"
+    key = f"{namespace}:{normalize_query(query)}"
+    with telemetry.stage("retrieve", k=k) as span:
+        (cache, result), shared = retrieval_flight.do(key, _retrieve, query, key, namespace,
+                                                      start_date, end_date, username, k)
+        if shared:
+            cache = "coalesced"
+        span.set_attribute("cache", cache)
+    telemetry.count("retrieval_cache.lookups", cache=cache)
+    return result
+
+def _retrieve(query, key, namespace, start_date, end_date, username, k):
+    version = pool.table_version(table_name, db_path)
+    cached = retrieval_cache.get(key, version)
+    if cached is not None:
+        return "exact", cached
+
+    query_vector = embed_queries([query])[0]
+    cached = retrieval_cache.lookup(query_vector, version, namespace)
+    if cached is not None:
+        return "semantic", cached
+
+    result = lancedb_hybrid_search(query, k, query_vector=query_vector,
+                                   start_date=start_date, end_date=end_date, username=username)
+    retrieval_cache.put(key, query_vector, result, version, namespace)
+    return "miss", result
+
+def assemble_context(retrieved_context):
+    """Pack the ranked tweets into the context token budget"""
+    with telemetry.stage("context", chunks=len(retrieved_context)) as span:
+        context, report = build_context(retrieved_context)
+        span.set_attribute("tokens", report["tokens"])
+    if report["used"] < report["chunks"] or report["truncated"]:
+        print(f"Context: {report['used']}/{report['chunks']} tweets in {report['tokens']} tokens "
+              f"({report['duplicates']} duplicates, {report['truncated']} truncated, {report['over_budget']} over budget)")
+    return context
+
+def rag_stream(thread_id_state, langgraph_workflow_state, query, retrieval=None, llm=None, filters=None):
+    """Retrieve context and return a token stream of the answer together with the source URLs.
+
+    ``retrieval`` may carry an already computed ``(context, urls)`` result, e.g. from a voice turn.
+    ``filters`` are passed on to ``retrieve`` (``start_date``, ``end_date``, ``username``).
+    """
+    retrieved_context, urls = retrieval if retrieval is not None else retrieve(query, **(filters or {}))
+    context = assemble_context(retrieved_context)
+    tokens = ask_llm_stream(thread_id_state, langgraph_workflow_state, query, context, llm)
+    return tokens, urls
 
 def rag(thread_id_state, langgraph_workflow_state, query, llm_choice, api_key):
     try:
-        retrieved_context, urls = lancedb_hybrid_search(query)
-        context = "\n".join(retrieved_context)
+        retrieved_context, urls = retrieve(query)
+        context = assemble_context(retrieved_context)
         full_response, chunks = ask_llm(thread_id_state, langgraph_workflow_state, query, context, llm_choice, api_key)
         return full_response, chunks, urls
 
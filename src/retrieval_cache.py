@@ -0,0 +1,144 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+max_distance = float(os.getenv("RETRIEVAL_CACHE_MAX_DISTANCE", "0.05"))
+max_entries = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "1024"))
+max_bytes = int(float(os.getenv("RETRIEVAL_CACHE_MAX_MB", "64")) * 1024 * 1024)
+ttl = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+
+
+def normalize_query(query):
+    """Lowercase and collapse whitespace so trivially different queries share a key"""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+class _Entry:
+    def __init__(self, vector, value, size, namespace):
+        self.vector = vector
+        self.namespace = namespace
+        self.value = value
+        self.size = size
+        self.created_at = time.monotonic()
+
+
+class SemanticCache:
+    """LRU/TTL cache of retrieval results keyed by query text and query embedding.
+
+    A lookup hits when the exact normalized query was seen before, or when a
+    cached query embedding lies within ``max_distance`` cosine distance. All
+    entries are dropped when the LanceDB table version changes.
+    """
+
+    def __init__(self, max_distance=max_distance, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, version):
+        """Return the cached value for an exact key, or None"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._live_entry(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def lookup(self, vector, version, namespace=None):
+        """Return the value of the nearest cached query within ``max_distance``, or None.
+
+        Only entries stored under the same ``namespace`` (e.g. search parameters) are considered.
+        """
+        vector = _unit(vector)
+        with self._lock:
+            self._check_version(version)
+            for key in list(self._entries):
+                self._live_entry(key)
+            keys = [key for key, entry in self._entries.items() if entry.namespace == namespace]
+            if keys:
+                matrix = np.stack([self._entries[key].vector for key in keys])
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                if 1.0 - float(similarities[best]) <= self.max_distance:
+                    self._entries.move_to_end(keys[best])
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return self._entries[keys[best]].value
+            self.misses += 1
+            return None
+
+    def put(self, key, vector, value, version, namespace=None):
+        vector = _unit(vector)
+        size = vector.nbytes + len(key) + sum(len(item) for part in value for item in part)
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(vector, value, size, namespace)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.created_at > self.ttl:
+            self._remove(key)
+            self.evictions += 1
+            return None
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
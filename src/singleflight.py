@@ -0,0 +1,167 @@
+import threading
+from concurrent.futures import Future
+from src import telemetry
+
+# Marks that the consumer has to pull the next item from the source itself; the source may yield None
+_PRODUCE = object()
+
+
+class SharedIterator:
+    """Replays one iterator to any number of consumers, each from the start, while it is produced.
+
+    There is no producer thread: whichever consumer needs the next item first
+    pulls it from the source, so the stream keeps going even if the consumer
+    that started it stops reading. Once every consumer has stopped before the
+    end, the source is closed; consumers joining later run their fallback.
+    """
+
+    def __init__(self, iterable, on_done=None):
+        self._source = iter(iterable)
+        self._items = []
+        self._done = False
+        self._error = None
+        self._producing = False
+        self._abandoned = False
+        self._consumers = 0
+        self._cond = threading.Condition()
+        self._on_done = on_done
+
+    def __iter__(self):
+        return self.join()
+
+    def join(self, fallback=None):
+        """Iterate the stream from the start.
+
+        If every earlier consumer abandoned it before this one started, ``fallback()``
+        is iterated instead (or, without one, a RuntimeError is raised).
+        """
+        with self._cond:
+            abandoned = self._abandoned
+            if not abandoned:
+                self._consumers += 1
+        if abandoned:
+            if fallback is None:
+                raise RuntimeError("Shared stream closed before it finished")
+            yield from fallback()
+            return
+        try:
+            yield from self._consume()
+        finally:
+            with self._cond:
+                self._consumers -= 1
+                abandoned = self._consumers == 0 and not self._done
+                self._abandoned = self._abandoned or abandoned
+            if abandoned:
+                close = getattr(self._source, "close", None)
+                if close:
+                    close()
+                self._finish(RuntimeError("Shared stream closed before it finished"))
+
+    def _consume(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._items) and not self._done and self._producing:
+                    self._cond.wait()
+                if index < len(self._items):
+                    item = self._items[index]
+                elif self._done:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                else:
+                    self._producing = True
+                    item = _PRODUCE
+            if item is _PRODUCE:
+                self._produce()
+                continue
+            index += 1
+            yield item
+
+    def _produce(self):
+        try:
+            item = next(self._source)
+        except StopIteration:
+            self._finish(None)
+        except Exception as e:
+            self._finish(e)
+        else:
+            with self._cond:
+                self._items.append(item)
+                self._producing = False
+                self._cond.notify_all()
+
+    def _finish(self, error):
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._producing = False
+            self._cond.notify_all()
+        if self._on_done:
+            self._on_done()
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution whose result all callers share"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run ``fn`` unless a call with ``key`` is already in flight, in which case wait for its result.
+
+        Returns ``(result, shared)`` where ``shared`` is True for callers that waited on another call.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            telemetry.count("singleflight.coalesced", flight=self.name)
+            return future.result(), True
+
+        try:
+            result = fn(*args, **kwargs)
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def share(self, key, factory):
+        """Return ``(SharedIterator, leader)`` for the stream in flight under ``key``, creating it with ``factory``"""
+        with self._lock:
+            shared = self._calls.get(key)
+            if shared is not None:
+                self.coalesced += 1
+                telemetry.count("singleflight.coalesced", flight=self.name)
+                return shared, False
+            self.executions += 1
+            shared = self._calls[key] = SharedIterator(factory(), on_done=lambda: self._forget(key, shared))
+            return shared, True
+
+    def stats(self):
+        with self._lock:
+            total = self.executions + self.coalesced
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalesced_rate": self.coalesced / total if total else 0.0,
+                "in_flight": len(self._calls),
+            }
+
+    def _forget(self, key, shared):
+        with self._lock:
+            if self._calls.get(key) is shared:
+                del self._calls[key]
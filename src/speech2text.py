@@ -1,35 +1,22 @@
-import os
-import logging
-from deepgram.utils import verboselogs
-from dotenv import load_dotenv
-
-from deepgram import (
-    DeepgramClient,
-    PrerecordedOptions,
-)
-load_dotenv()
-api_key = os.getenv("DG_API_KEY")
+from src.deepgram_client import transcribe, transcribe_async
+from src import telemetry
 
 def speech2text(audio):
+    """Transcribe an in-memory audio buffer (bytes, bytearray or memoryview)"""
     try:
-        deepgram: DeepgramClient = DeepgramClient(api_key=api_key)
-
-        with open(audio, "rb") as file:
-            buffer_data = file.read()
-
-        payload: FileSource = {
-            "buffer": buffer_data,
-        }
-
-        options = PrerecordedOptions(
-            model="nova-2",
-            smart_format=True,
-        )
-
-        response = deepgram.listen.rest.v("1").transcribe_file(payload, options)
+        with telemetry.stage("stt", audio_bytes=len(audio)):
+            transcript = transcribe(audio)
+        print(f"Transcript: {transcript}")
+        return transcript
 
-        transcript = response['results']['channels'][0]['alternatives'][0]['transcript']
+    except Exception as e:
+        print(f"Exception: {e}")
 
+async def speech2text_async(audio):
+    """Async variant of speech2text that can be awaited alongside retrieval"""
+    try:
+        with telemetry.stage("stt", audio_bytes=len(audio)):
+            transcript = await transcribe_async(audio)
         print(f"Transcript: {transcript}")
         return transcript
 
@@ -38,4 +25,5 @@ def speech2text(audio):
 
 
 if __name__ == "__main__":
-    speech2text("test.mp3")
\ No newline at end of file
+    with open("test.mp3", "rb") as file:
+        speech2text(file.read())
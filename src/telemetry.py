@@ -0,0 +1,100 @@
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Spans and metrics go to the global OpenTelemetry providers that openlit.init()
+# configures, i.e. the OTLP collector at OTEL_EXPORTER_OTLP_ENDPOINT
+enabled = (os.getenv("TELEMETRY_ENABLED", "true").lower() not in ("0", "false", "no")
+           and os.getenv("OTEL_SDK_DISABLED", "false").lower() != "true")
+
+try:
+    from opentelemetry import context, metrics, trace
+    from opentelemetry.trace import Status, StatusCode
+except ImportError:
+    enabled = False
+
+if enabled:
+    _tracer = trace.get_tracer("rag_app")
+    _meter = metrics.get_meter("rag_app")
+    _duration = _meter.create_histogram(
+        "rag.stage.duration", unit="s", description="Duration of each RAG pipeline stage"
+    )
+    _errors = _meter.create_counter("rag.stage.errors", description="Pipeline stages that raised")
+    _counters = {}
+
+
+class _NoopStage:
+    """Shared stand-in used when telemetry is disabled; costs one attribute lookup per stage"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NOOP = _NoopStage()
+
+
+class _Stage:
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self._span_manager = _tracer.start_as_current_span(f"rag.{self.name}", attributes=self.attributes)
+        self._span = self._span_manager.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        attributes = {"stage": self.name, "error": exc is not None}
+        _duration.record(elapsed, attributes)
+        if exc is not None:
+            _errors.add(1, {"stage": self.name, "exception": exc_type.__name__})
+            self._span.set_status(Status(StatusCode.ERROR, str(exc)))
+        return self._span_manager.__exit__(exc_type, exc, tb)
+
+    def set_attribute(self, key, value):
+        self._span.set_attribute(key, value)
+
+
+def stage(name, **attributes):
+    """Context manager that traces a pipeline stage as a span and records its duration.
+
+    ``with stage("rerank", candidates=20) as span: span.set_attribute("k", 5)``
+    """
+    if not enabled:
+        return _NOOP
+    return _Stage(name, attributes)
+
+
+def count(name, amount=1, **attributes):
+    """Add ``amount`` to the counter ``rag.<name>``"""
+    if not enabled:
+        return
+    counter = _counters.get(name)
+    if counter is None:
+        counter = _counters.setdefault(name, _meter.create_counter(f"rag.{name}"))
+    counter.add(amount, attributes)
+
+
+def propagate(fn):
+    """Wrap ``fn`` so that spans it opens on a worker thread nest under the caller's current span"""
+    if not enabled:
+        return fn
+    parent = context.get_current()
+
+    def run(*args, **kwargs):
+        token = context.attach(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            context.detach(token)
+    return run
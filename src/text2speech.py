@@ -1,34 +1,24 @@
-import os
-import logging
-from deepgram.utils import verboselogs
-from dotenv import load_dotenv
+from src.deepgram_client import speak, speak_async
+from src import telemetry
 
-from deepgram import (
-    DeepgramClient,
-    SpeakOptions,
-)
-
-load_dotenv()
-api_key = os.getenv("DG_API_KEY")
-
-
-
-def text2speech(text, filename):
+def text2speech(text):
+    """Synthesize ``text`` and return the linear16 WAV audio as bytes"""
     try:
-        SPEAK_OPTIONS = {"text": text}
-        deepgram = DeepgramClient(api_key=api_key)
+        with telemetry.stage("tts", characters=len(text)):
+            return speak(text)
 
-        options = SpeakOptions(
-            model="aura-helios-en",
-            encoding="linear16",
-        )
+    except Exception as e:
+        print(f"Exception: {e}")
 
-        response = deepgram.speak.rest.v("1").save(filename, SPEAK_OPTIONS, options)
-        # print(response.to_json(indent=4))
-        return filename
+async def text2speech_async(text):
+    """Async variant of text2speech"""
+    try:
+        with telemetry.stage("tts", characters=len(text)):
+            return await speak_async(text)
 
     except Exception as e:
         print(f"Exception: {e}")
 
 if __name__ == "__main__":
-    text2speech("Read this [Tweet](www.example.com)")
\ No newline at end of file
+    audio = text2speech("Read this [Tweet](www.example.com)")
+    print(f"Synthesized {len(audio or b'')} bytes")
@@ -0,0 +1,125 @@
+import io
+import os
+import re
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from src.text2speech import text2speech
+from utils.clean_for_tts import clean_for_tts
+from utils.remove_emojis import remove_emojis
+from utils.metrics import LatencyStats
+
+load_dotenv()
+
+# Sentences synthesized concurrently across all sessions of this process
+tts_max_workers = int(os.getenv("TTS_MAX_WORKERS", "3"))
+_tts_executor = ThreadPoolExecutor(max_workers=tts_max_workers, thread_name_prefix="tts")
+
+# Deepgram linear16 output defaults to 24 kHz, 16-bit mono
+DEFAULT_SAMPLE_RATE = 24000
+
+# Time from the start of an answer to its first playable audio segment
+first_audio_stats = LatencyStats()
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+class SentenceSplitter:
+    """Incrementally split streamed text into sentences"""
+
+    def __init__(self, min_chars=20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        """Add streamed text and return the sentences completed so far"""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.start()].strip()
+            # Merge very short fragments ("Yes.") with the next sentence
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Return whatever text is left once the stream has ended"""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+def audio_duration(audio_bytes):
+    """Return the playback duration of a WAV (or raw linear16) buffer in seconds"""
+    try:
+        with wave.open(io.BytesIO(audio_bytes)) as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except (wave.Error, EOFError):
+        return len(audio_bytes) / (DEFAULT_SAMPLE_RATE * 2)
+
+
+class StreamingTTS:
+    """Synthesizes an answer sentence by sentence while it is still being generated.
+
+    Sentences are synthesized concurrently on a bounded pool; ``poll`` and
+    ``drain`` hand segments back strictly in order, each one only once the
+    previous segment has finished playing.
+    """
+
+    def __init__(self, synthesize=text2speech, min_chars=20):
+        self._synthesize = synthesize
+        self._splitter = SentenceSplitter(min_chars=min_chars)
+        self._futures = []
+        self._next = 0
+        self._play_end = 0.0
+        self._start = time.perf_counter()
+        self.first_audio = None
+
+    def feed(self, text):
+        for sentence in self._splitter.feed(text):
+            self._submit(sentence)
+
+    def close(self):
+        for sentence in self._splitter.flush():
+            self._submit(sentence)
+
+    def poll(self):
+        """Return the next segment if it is ready and due, without blocking; otherwise None"""
+        while self._next < len(self._futures) and time.monotonic() >= self._play_end:
+            future = self._futures[self._next]
+            if not future.done():
+                return None
+            self._next += 1
+            audio = future.result()
+            if audio:
+                return self._schedule(audio)
+        return None
+
+    def drain(self):
+        """Yield the remaining segments in order, waiting for synthesis and playback"""
+        while self._next < len(self._futures):
+            audio = self._futures[self._next].result()
+            self._next += 1
+            if not audio:
+                continue
+            delay = self._play_end - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            yield self._schedule(audio)
+
+    def _submit(self, sentence):
+        text = clean_for_tts(remove_emojis(sentence)).strip()
+        if text:
+            self._futures.append(_tts_executor.submit(self._synthesize, text))
+
+    def _schedule(self, audio):
+        self._play_end = time.monotonic() + audio_duration(audio)
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter() - self._start
+            first_audio_stats.record(self.first_audio)
+            print(f"Time to first audio: {self.first_audio * 1000:.0f} ms")
+        return audio
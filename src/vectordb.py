@@ -1,25 +1,183 @@
 import os
+import time
+import pandas as pd
+import pyarrow as pa
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import lancedb
-from lancedb.rerankers import LinearCombinationReranker, CrossEncoderReranker
+from lancedb.rerankers import LinearCombinationReranker, RRFReranker
+from src.db_pool import get_table
+from src.encoders import embed_texts, rerank_scores
+from src import telemetry
+from utils.metrics import LatencyStats
 
 load_dotenv()
 
 db_path = os.getenv("LANCEDB_PATH")
 table_name = os.getenv("LANCEDB_TABLE")
 
-cross_encoder_model = "cross-encoder/ms-marco-MiniLM-L-2-v2"
-ce_reranker = CrossEncoderReranker(model_name=cross_encoder_model)
 lc_reranker = LinearCombinationReranker(weight=0.7)
+rrf_reranker = RRFReranker()
 
-def lancedb_hybrid_search(query, k=5):
-    db = lancedb.connect(db_path)
-    table = db.open_table(table_name)
-    
-    results = table.search(query, query_type="hybrid").rerank(reranker=ce_reranker).limit(k).to_list()
+# Two-stage rerank: the fused ranking ("rrf" or "linear") keeps this many
+# candidates per query, and only those are scored by the cross-encoder
+rerank_candidates = int(os.getenv("RERANK_CANDIDATES", "20"))
+rerank_fusion = os.getenv("RERANK_FUSION", "rrf")
 
+result_columns = ["tweet_id", "text", "created_at", "url", "username"]
+stage_stats = {"search": LatencyStats(), "fusion": LatencyStats(), "rerank": LatencyStats()}
+
+# Vector search tunables, only used once the table has an ANN index
+nprobes = int(os.getenv("LANCEDB_NPROBES", "20"))
+refine_factor = int(os.getenv("LANCEDB_REFINE_FACTOR", "0")) or None
+
+# Number of queries whose FTS and vector legs run concurrently in batch mode
+search_workers = int(os.getenv("LANCEDB_SEARCH_WORKERS", "8"))
+_search_executor = ThreadPoolExecutor(max_workers=search_workers)
+
+def _format_results(results):
     # Format context to include both text and created_at date
     context = [f"On {result['created_at']}, Elon Musk tweeted: {result['text']}, Tweet URL: {result['url']}" for result in results]
     urls = [result['url'] for result in results]
-    
-    return context, urls
\ No newline at end of file
+    return context, urls
+
+def _timestamp_literal(value):
+    # created_at is stored as naive UTC
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return f"timestamp '{timestamp.strftime('%Y-%m-%d %H:%M:%S')}'"
+
+def build_filter(start_date=None, end_date=None, username=None):
+    """Build a SQL pre-filter for tweets created in [start_date, end_date) and/or by ``username``"""
+    clauses = []
+    if start_date is not None:
+        clauses.append(f"created_at >= {_timestamp_literal(start_date)}")
+    if end_date is not None:
+        clauses.append(f"created_at < {_timestamp_literal(end_date)}")
+    if username:
+        escaped = username.replace("'", "''")
+        clauses.append(f"username = '{escaped}'")
+    return " AND ".join(clauses) or None
+
+def _tune(search, nprobes, refine_factor):
+    """Apply ANN tunables to a vector or hybrid query builder"""
+    search = search.nprobes(nprobes)
+    if refine_factor:
+        search = search.refine_factor(refine_factor)
+    return search
+
+def vector_search(table, vector, nprobes=nprobes, refine_factor=refine_factor):
+    """Vector query builder on ``table`` with the ANN tunables applied"""
+    return _tune(table.search(vector, query_type="vector"), nprobes, refine_factor)
+
+def embed_queries(queries):
+    """Embed all queries in one batched encoder pass"""
+    queries = list(queries)
+    with telemetry.stage("embed", queries=len(queries)):
+        return embed_texts(queries)
+
+def _normalize(results, column):
+    """Min-max scale a score column to [0, 1], as LanceDB does before fusing hybrid results"""
+    if results.num_rows == 0:
+        return results
+    scores = results[column].to_numpy().astype("float32")
+    spread = scores.max() - scores.min()
+    scores = (scores - scores.min()) / spread if spread else scores - scores.min()
+    index = results.column_names.index(column)
+    return results.set_column(index, column, pa.array(scores, type=pa.float32()))
+
+def _hybrid_candidates(table, query, vector, k, nprobes=nprobes, refine_factor=refine_factor, where=None):
+    """Run the vector and FTS legs for one query and return their ``k`` best hits each"""
+    vector_leg = vector_search(table, vector, nprobes, refine_factor)
+    fts_leg = table.search(query, query_type="fts")
+    if where:
+        vector_leg = vector_leg.where(where, prefilter=True)
+        fts_leg = fts_leg.where(where, prefilter=True)
+    with telemetry.stage("vector_search", k=k, filtered=bool(where)):
+        vector_hits = vector_leg.select(result_columns).with_row_id(True).limit(k).to_arrow()
+    with telemetry.stage("fts_search", k=k, filtered=bool(where)):
+        fts_hits = fts_leg.select(result_columns).with_row_id(True).limit(k).to_arrow()
+    return vector_hits, fts_hits
+
+def _fuse(query, vector_hits, fts_hits, candidates, fusion=rerank_fusion):
+    """Cheap first stage: fuse both legs and keep the ``candidates`` best hits"""
+    reranker = lc_reranker if fusion == "linear" else rrf_reranker
+    fused = reranker.rerank_hybrid(query, _normalize(vector_hits, "_distance"), _normalize(fts_hits, "_score"))
+    return fused.slice(0, candidates).to_pylist()
+
+def lancedb_hybrid_search(query, k=5, query_vector=None, nprobes=nprobes, refine_factor=refine_factor,
+                          start_date=None, end_date=None, username=None, candidates=rerank_candidates):
+    """Hybrid search reranked in two stages.
+
+    A fused ranking of the vector and FTS legs keeps ``candidates`` hits, and
+    only those are scored by the cross-encoder before the top ``k`` are returned.
+    ``start_date``/``end_date`` (end exclusive) and ``username`` are applied as
+    pre-filters before the vector and FTS legs run.
+    """
+    query_vectors = None if query_vector is None else [query_vector]
+    hits = search_hits([query], k, query_vectors, nprobes, refine_factor,
+                       build_filter(start_date, end_date, username), candidates)[0]
+    return _format_results(hits)
+
+def lancedb_hybrid_search_batch(queries, k=5, nprobes=nprobes, refine_factor=refine_factor,
+                                start_date=None, end_date=None, username=None, candidates=rerank_candidates):
+    """Hybrid search for many queries at once.
+
+    Returns one ``(context, urls)`` tuple per query, like ``lancedb_hybrid_search``.
+    """
+    queries = list(queries)
+    if not queries:
+        return []
+    hits = search_hits(queries, k, None, nprobes, refine_factor,
+                       build_filter(start_date, end_date, username), candidates)
+    return [_format_results(query_hits) for query_hits in hits]
+
+def search_hits(queries, k=5, query_vectors=None, nprobes=nprobes, refine_factor=refine_factor, where=None,
+                candidates=rerank_candidates, fusion=rerank_fusion):
+    """Run the two-stage hybrid search and return the ranked hit rows (dicts) for each query"""
+    fused = candidate_hits(queries, max(candidates, k), query_vectors, nprobes, refine_factor, where, fusion)
+
+    start = time.perf_counter()
+    with telemetry.stage("rerank", pairs=sum(len(hits) for hits in fused)):
+        outputs = _rerank_candidates(queries, fused, k)
+    stage_stats["rerank"].record(time.perf_counter() - start)
+    return outputs
+
+def candidate_hits(queries, k=5, query_vectors=None, nprobes=nprobes, refine_factor=refine_factor, where=None,
+                   fusion=rerank_fusion):
+    """First stage only: the ``k`` best fused vector and FTS hit rows (dicts) for each query"""
+    table = get_table(table_name, db_path)
+    if query_vectors is None:
+        query_vectors = embed_queries(queries)
+
+    start = time.perf_counter()
+    legs = list(_search_executor.map(
+        telemetry.propagate(lambda args: _hybrid_candidates(table, args[0], args[1], k, nprobes, refine_factor, where)),
+        zip(queries, query_vectors),
+    ))
+    stage_stats["search"].record(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with telemetry.stage("fusion", fusion=fusion, candidates=k):
+        fused = [_fuse(query, vector_hits, fts_hits, k, fusion) for query, (vector_hits, fts_hits) in zip(queries, legs)]
+    stage_stats["fusion"].record(time.perf_counter() - start)
+    return fused
+
+def _rerank_candidates(queries, candidates, k):
+    """Rerank each query's candidates with the cross-encoder and keep the top ``k``"""
+    # Score every (query, candidate) pair in a single cross-encoder call
+    pairs = [[query, hit["text"]] for query, hits in zip(queries, candidates) for hit in hits]
+    scores = rerank_scores(pairs) if pairs else []
+
+    outputs = []
+    offset = 0
+    for hits in candidates:
+        hit_scores = scores[offset:offset + len(hits)]
+        offset += len(hits)
+        ranked = [hit for _, hit in sorted(zip(hit_scores, hits), key=lambda pair: pair[0], reverse=True)]
+        outputs.append(ranked[:k])
+    return outputs
+
+def search_stats():
+    """Latency of each search stage (vector + FTS legs, fusion, cross-encoder)"""
+    return {stage: stats.snapshot() for stage, stats in stage_stats.items()}
@@ -0,0 +1,111 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from src.deepgram_client import transcribe, transcribe_stream
+from src.rag import retrieve
+from src.retrieval_cache import normalize_query
+from src.warmup import warmup_service
+from src import telemetry
+
+load_dotenv()
+
+# Words an early transcript needs before retrieval is started speculatively
+speculation_min_words = int(os.getenv("VOICE_SPECULATION_MIN_WORDS", "5"))
+_voice_executor = ThreadPoolExecutor(max_workers=int(os.getenv("VOICE_WORKERS", "16")), thread_name_prefix="voice")
+
+_stats_lock = threading.Lock()
+speculation_stats = {"hits": 0, "misses": 0, "skipped": 0, "errors": 0}
+
+
+def _count(outcome):
+    with _stats_lock:
+        speculation_stats[{"hit": "hits", "miss": "misses", "skipped": "skipped", "error": "errors"}[outcome]] += 1
+    if outcome != "skipped":
+        telemetry.count("voice.speculation", outcome=outcome)
+
+
+def _retrieve_when_ready(query):
+    # Transcription overlaps model warm-up; retrieval itself needs the models loaded
+    if not warmup_service.start().wait():
+        raise RuntimeError(f"Setup failed: {warmup_service.error}")
+    return retrieve(query)
+
+
+class VoiceTurn:
+    """Runs one voice query with transcription and retrieval overlapped.
+
+    The recording is streamed to Deepgram's live endpoint. As soon as an early
+    transcript has ``min_words`` words, retrieval for it starts in the
+    background. When the final transcript matches (after normalization) the
+    speculative result is reused; otherwise it is discarded and retrieval runs
+    on the final text, which is usually cheap because the speculative run
+    warmed the semantic retrieval cache.
+    """
+
+    def __init__(self, audio, retrieve=_retrieve_when_ready, min_words=speculation_min_words):
+        self._audio = bytes(audio)
+        self._retrieve = retrieve
+        self.min_words = min_words
+        self._lock = threading.Lock()
+        self.speculative_text = None
+        self._speculative = None
+        # "stream", or "rest" after falling back to the pre-recorded endpoint
+        self.mode = None
+        self._transcript = _voice_executor.submit(self._transcribe)
+
+    def transcript(self, timeout=None):
+        """Wait for and return the final transcript"""
+        return self._transcript.result(timeout)
+
+    def speculation(self):
+        """Return "hit", "miss" or "skipped" for the final transcript, without waiting for any retrieval"""
+        final = self.transcript()
+        # Updates only arrive while transcribing, so the speculative text is settled by now
+        with self._lock:
+            speculative_text = self.speculative_text
+        if speculative_text is None:
+            return "skipped"
+        return "hit" if normalize_query(speculative_text) == normalize_query(final) else "miss"
+
+    def retrieval(self):
+        """Return ``(context, urls)`` for the final transcript, reusing the speculative result when it matches"""
+        outcome = self.speculation()
+        if outcome == "hit":
+            try:
+                result = self._speculative.result()
+            except Exception as e:
+                # The final transcript is known, so retrieve it again rather than fail the turn
+                print(f"Speculative retrieval failed, retrieving again: {str(e)}")
+                outcome = "error"
+            else:
+                _count(outcome)
+                return result
+        elif outcome == "miss":
+            self._speculative.cancel()
+        _count(outcome)
+        return self._retrieve(self.transcript())
+
+    def _on_update(self, text, is_final):
+        with self._lock:
+            if self._speculative is None and len(text.split()) >= self.min_words:
+                self.speculative_text = text
+                self._speculative = _voice_executor.submit(self._retrieve, text)
+
+    def _transcribe(self):
+        with telemetry.stage("stt", audio_bytes=len(self._audio)) as span:
+            try:
+                span.set_attribute("mode", "stream")
+                self.mode = "stream"
+                return transcribe_stream(self._audio, self._on_update)
+            except Exception as e:
+                # Fall back to the pre-recorded endpoint (e.g. when the live endpoint is unavailable)
+                print(f"Streaming transcription failed, falling back to REST: {str(e)}")
+                span.set_attribute("mode", "rest")
+                self.mode = "rest"
+                return transcribe(self._audio)
+
+
+def start_voice_turn(audio):
+    """Start transcribing ``audio`` right away and return the VoiceTurn"""
+    return VoiceTurn(audio)
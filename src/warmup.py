@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+
+WARMUP_QUERY = "What did Elon Musk tweet about Starship?"
+
+
+class WarmupService:
+    """Builds the database and loads models once per process in a background thread.
+
+    ``start`` is idempotent, so Streamlit reruns only read the current state.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self.state = "pending"
+        self.step = None
+        self.error = None
+        self.timings = {}
+
+    def start(self):
+        with self._lock:
+            # Start once, or again after a failed attempt
+            if self._thread is None or self.state == "failed":
+                self.state = "running"
+                self.error = None
+                self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+                self._thread.start()
+        return self
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        """Block until warm-up finished (or failed); returns True when ready"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.state in ("pending", "running"):
+            if self._ready.wait(timeout=0.1):
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        return self.ready
+
+    def status(self):
+        return {"state": self.state, "step": self.step, "error": self.error, "timings": dict(self.timings)}
+
+    def _run(self):
+        # Imported here so that loading the models does not happen on the importing thread
+        from init_lancedb import initialize_database
+        from src.db_pool import get_table
+        from src.vectordb import embed_queries, db_path, table_name
+        from src.encoders import get_cross_encoder
+        from src.rag import retrieve
+        from utils.count_tokens import load_tokenizers
+
+        # Set by ``python api.py`` once it has built the database before starting the workers
+        if os.getenv("DATABASE_INITIALIZED") == "1":
+            database = lambda: get_table(table_name, db_path)
+        else:
+            database = initialize_database
+        steps = [
+            ("database", database),
+            ("embedding model", lambda: embed_queries([WARMUP_QUERY])),
+            ("cross-encoder", get_cross_encoder),
+            ("tokenizers", load_tokenizers),
+            ("warm-up query", lambda: retrieve(WARMUP_QUERY)),
+        ]
+        try:
+            for name, step in steps:
+                self.step = name
+                start = time.perf_counter()
+                step()
+                self.timings[name] = time.perf_counter() - start
+                print(f"Warm-up step '{name}' finished in {self.timings[name]:.2f}s")
+            self.step = None
+            self.state = "ready"
+            self._ready.set()
+        except Exception as e:
+            print(f"Warm-up failed during '{self.step}': {str(e)}")
+            self.error = str(e)
+            self.state = "failed"
+
+
+warmup_service = WarmupService()
+
+
+def start_warmup():
+    """Start the process-wide warm-up (no-op if it is already running or done)"""
+    return warmup_service.start()
@@ -0,0 +1 @@
+# Local stand-ins for external APIs, used for load tests and offline runs
@@ -0,0 +1,153 @@
+"""Local stub of the Deepgram transcribe (/v1/listen) and speak (/v1/speak) endpoints.
+
+Run with ``python -m stubs.deepgram --port 8089`` and set ``DG_API_URL=http://127.0.0.1:8089``.
+/v1/listen answers both the pre-recorded REST call and the live websocket, which
+sends an interim ``Results`` message per audio frame and the final one after CloseStream.
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import struct
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+SAMPLE_RATE = 24000
+# RFC 6455 handshake key suffix
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def silent_wav(seconds):
+    """Return a mono 16-bit WAV buffer of silence"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(b"\x00\x00" * int(SAMPLE_RATE * seconds))
+    return buffer.getvalue()
+
+
+def _results(transcript, is_final):
+    return {"type": "Results", "is_final": is_final, "speech_final": is_final,
+            "channel": {"alternatives": [{"transcript": transcript, "confidence": 1.0}]}}
+
+
+def make_handler(transcript, latency, chars_per_second):
+    words = transcript.split()
+
+    class DeepgramStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if urlparse(self.path).path != "/v1/listen" or self.headers.get("Upgrade", "").lower() != "websocket":
+                self._send(404, "application/json", b'{"err_msg": "not found"}')
+                return
+            accept = base64.b64encode(hashlib.sha1((self.headers["Sec-WebSocket-Key"] + WEBSOCKET_GUID).encode()).digest())
+            self.send_response(101)
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept.decode())
+            self.end_headers()
+            self.close_connection = True
+            self._listen()
+
+        def _listen(self):
+            # Each audio frame reveals half of the transcript more, so a short question is complete
+            # in an interim result before the final one, as with Deepgram's ~1s interim cadence
+            step = -(-len(words) // 2)
+            frames = 0
+            while True:
+                opcode, data = self._read_frame()
+                if opcode is None or opcode == 0x8:
+                    return
+                if opcode == 0x2:
+                    frames += 1
+                    self._send_text(_results(" ".join(words[:frames * step]), False))
+                elif opcode == 0x1 and json.loads(data).get("type") == "CloseStream":
+                    break
+            self._send_text(_results(transcript, False))
+            time.sleep(latency)
+            self._send_text(_results(transcript, True))
+            self._send_frame(0x8, struct.pack("!H", 1000))
+            # Wait for the client's close frame before the connection is torn down
+            while self._read_frame()[0] not in (None, 0x8):
+                pass
+
+        def _read_frame(self):
+            head = self.rfile.read(2)
+            if len(head) < 2:
+                return None, None
+            opcode, length = head[0] & 0x0F, head[1] & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", self.rfile.read(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", self.rfile.read(8))[0]
+            mask = self.rfile.read(4) if head[1] & 0x80 else None
+            data = self.rfile.read(length)
+            if mask:
+                data = bytes(byte ^ mask[i % 4] for i, byte in enumerate(data))
+            return opcode, data
+
+        def _send_text(self, payload):
+            self._send_frame(0x1, json.dumps(payload).encode())
+
+        def _send_frame(self, opcode, data):
+            if len(data) < 126:
+                header = struct.pack("!BB", 0x80 | opcode, len(data))
+            elif len(data) < 65536:
+                header = struct.pack("!BBH", 0x80 | opcode, 126, len(data))
+            else:
+                header = struct.pack("!BBQ", 0x80 | opcode, 127, len(data))
+            self.wfile.write(header + data)
+            self.wfile.flush()
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            path = urlparse(self.path).path
+            if path == "/v1/listen":
+                payload = {"results": {"channels": [{"alternatives": [{"transcript": transcript, "confidence": 1.0}]}]}}
+                self._send(200, "application/json", json.dumps(payload).encode())
+            elif path == "/v1/speak":
+                text = json.loads(body or b"{}").get("text", "")
+                self._send(200, "audio/wav", silent_wav(len(text) / chars_per_second))
+            else:
+                self._send(404, "application/json", b'{"err_msg": "not found"}')
+
+        def _send(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return DeepgramStubHandler
+
+
+def start_server(port=0, transcript="What did Elon Musk tweet about Starship?", latency=0.1, chars_per_second=15.0):
+    """Start the stub in a background thread and return the server (``server.server_address`` has the port)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(transcript, latency, chars_per_second))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds added to every response")
+    parser.add_argument("--transcript", default="What did Elon Musk tweet about Starship?")
+    args = parser.parse_args()
+    server = start_server(args.port, args.transcript, args.latency)
+    print(f"Deepgram stub listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
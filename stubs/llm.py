@@ -0,0 +1,132 @@
+"""Local stub of an OpenAI-compatible chat completions endpoint (OpenAI and Groq).
+
+Run with ``python -m stubs.llm --port 8090`` and set ``OPENAI_BASE_URL=http://127.0.0.1:8090/v1``
+and/or ``GROQ_BASE_URL=http://127.0.0.1:8090`` (the Groq client appends ``/openai/v1``).
+Answers stream as server-sent events at ``tokens_per_second`` after ``latency`` seconds;
+``error_rate`` of the requests get a 503 and ``rate_limit_rate`` a 429 with Retry-After.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+ANSWER = (
+    "Elon Musk tweeted that Starship is the most powerful rocket ever built. "
+    "He said the next flight will attempt to catch the booster with the launch tower. "
+    "He also mentioned that a fully reusable rocket is essential for making life multiplanetary."
+)
+
+
+def make_handler(answer, latency, tokens_per_second, error_rate, rate_limit_rate=0.0, retry_after=1.0):
+    tokens = [word + " " for word in answer.split()]
+
+    class LLMStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not urlparse(self.path).path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+                return
+            if random.random() < error_rate:
+                self._send_json(503, {"error": {"message": "stub overloaded", "type": "server_error"}})
+                return
+            if random.random() < rate_limit_rate:
+                self._send_json(429, {"error": {"message": "stub rate limit", "type": "rate_limit_exceeded"}},
+                                {"Retry-After": f"{retry_after:g}"})
+                return
+
+            time.sleep(latency)
+            model = body.get("model", "stub")
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            usage = {"prompt_tokens": sum(len(str(m.get("content", "")).split()) for m in body.get("messages", [])),
+                     "completion_tokens": len(tokens)}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            if body.get("stream"):
+                self._stream(completion_id, model, usage)
+            else:
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+
+        def _stream(self, completion_id, model, usage):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def chunk(delta, finish_reason=None):
+                return {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+            self._event(chunk({"role": "assistant", "content": ""}))
+            for token in tokens:
+                time.sleep(1.0 / tokens_per_second)
+                self._event(chunk({"content": token}))
+            final = chunk({}, "stop")
+            final["usage"] = usage
+            self._event(final)
+            self._write(b"data: [DONE]\n\n")
+            self._write(b"")
+
+        def _event(self, payload):
+            self._write(f"data: {json.dumps(payload)}\n\n".encode())
+
+        def _write(self, data):
+            # One HTTP chunk per event, so clients see each token as soon as it is sent
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return LLMStubHandler
+
+
+def start_server(port=0, answer=ANSWER, latency=0.2, tokens_per_second=50.0, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1.0):
+    """Start the stub in a background thread and return the server (``server.server_address`` has the port)"""
+    handler = make_handler(answer, latency, tokens_per_second, error_rate, rate_limit_rate, retry_after)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429")
+    args = parser.parse_args()
+    server = start_server(args.port, latency=args.latency, tokens_per_second=args.tokens_per_second,
+                          error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                          retry_after=args.retry_after)
+    print(f"LLM stub listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
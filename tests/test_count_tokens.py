@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+import pytest
+from src import context_builder
+from src.langgraph_workflow import prompt_model
+from utils import count_tokens
+
+
+@pytest.fixture
+def no_tokenizers(monkeypatch):
+    monkeypatch.setattr(count_tokens, "_load", lambda name: None)
+    count_tokens._encoding.cache_clear()
+    yield
+    count_tokens._encoding.cache_clear()
+
+
+@pytest.mark.parametrize("model, limit", [
+    ("llama3-8b-8192", 8192 - 1024),
+    ("gpt-3.5-turbo", 16385 - 1024),
+    (None, 8192 - 1024),
+])
+def test_prompt_limit_follows_the_model(model, limit):
+    assert context_builder.prompt_token_limit(model) == limit
+
+
+def test_dispatcher_prompts_fit_the_smallest_window():
+    groq, openai = SimpleNamespace(model_name="llama3-8b-8192"), SimpleNamespace(model_name="gpt-3.5-turbo")
+    dispatcher = SimpleNamespace(providers=[SimpleNamespace(llm=openai), SimpleNamespace(llm=groq)])
+    assert prompt_model(openai) == "gpt-3.5-turbo"
+    assert prompt_model(dispatcher) == "llama3-8b-8192"
+    assert prompt_model(SimpleNamespace()) is None
+
+
+def test_estimates_are_counted_without_a_tokenizer(no_tokenizers):
+    before = count_tokens.estimated
+    assert count_tokens.count_tokens("twelve chars", "gpt-3.5-turbo") == 3
+    assert count_tokens.truncate_tokens("twelve chars", 1, "gpt-3.5-turbo") == "twel"
+    assert count_tokens.estimated == before + 2
+
+
+def test_token_stats_are_plain_numbers(no_tokenizers):
+    context_builder.record_prompt(1200)
+    snapshot = context_builder.stats()["prompt_tokens"]
+    assert snapshot["max"] >= 1200
+    assert not any(key.endswith("_ms") for key in snapshot)
+
+
+def test_warm_up_loads_every_model_tokenizer(monkeypatch):
+    loaded = []
+    monkeypatch.setattr(count_tokens, "_load", lambda name: loaded.append(name))
+    count_tokens._encoding.cache_clear()
+    count_tokens.load_tokenizers()
+    count_tokens._encoding.cache_clear()
+    # Defaults load without a Hugging Face hub call
+    assert loaded and all("/" not in name for name in loaded)
@@ -0,0 +1,77 @@
+import asyncio
+import io
+import wave
+import weakref
+import pytest
+from src import deepgram_client
+from stubs import deepgram
+
+TRANSCRIPT = "What did Elon Musk tweet about Starship?"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def stub_server():
+    server = deepgram.start_server(transcript=TRANSCRIPT, latency=0.01, chars_per_second=100.0)
+    patch = pytest.MonkeyPatch()
+    patch.setattr(deepgram_client, "api_url", f"http://127.0.0.1:{server.server_address[1]}")
+    patch.setattr(deepgram_client, "_client", None)
+    patch.setattr(deepgram_client, "_async_clients", weakref.WeakKeyDictionary())
+    yield server
+    patch.undo()
+    server.shutdown()
+
+
+def wav_seconds(audio):
+    with wave.open(io.BytesIO(audio)) as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def test_transcribe():
+    assert deepgram_client.transcribe(deepgram.silent_wav(0.1)) == TRANSCRIPT
+
+
+def test_transcribe_accepts_memoryview():
+    assert deepgram_client.transcribe(memoryview(deepgram.silent_wav(0.1))) == TRANSCRIPT
+
+
+def test_transcribe_reuses_the_pooled_client():
+    deepgram_client.transcribe(deepgram.silent_wav(0.1))
+    client = deepgram_client.get_client()
+    deepgram_client.transcribe(deepgram.silent_wav(0.1))
+    assert deepgram_client.get_client() is client
+
+
+def test_speak_returns_wav():
+    text = "Starship is go for launch."
+    audio = deepgram_client.speak(text)
+    assert audio[:4] == b"RIFF"
+    assert wav_seconds(audio) == pytest.approx(len(text) / 100.0, abs=0.01)
+
+
+def test_async_variants():
+    async def run():
+        return await asyncio.gather(
+            deepgram_client.transcribe_async(deepgram.silent_wav(0.1)),
+            deepgram_client.speak_async("Hello"),
+        )
+
+    transcript, audio = asyncio.run(run())
+    assert transcript == TRANSCRIPT
+    assert audio[:4] == b"RIFF"
+
+
+def test_transcribe_stream_reports_interim_and_final_results():
+    updates = []
+    transcript = deepgram_client.transcribe_stream(deepgram.silent_wav(0.5), lambda text, final: updates.append((text, final)))
+    assert transcript == TRANSCRIPT
+    assert updates[0] == ("What did Elon Musk", False)
+    assert updates[-1] == (TRANSCRIPT, True)
+    assert all(not final for _, final in updates[:-1])
+
+
+def test_latencies_are_recorded():
+    before = deepgram_client.transcribe_latency.count
+    deepgram_client.transcribe(deepgram.silent_wav(0.1))
+    assert deepgram_client.transcribe_latency.count == before + 1
+    deepgram_client.speak("Hello")
+    assert deepgram_client.stats()["speak"]["count"] >= 1
@@ -0,0 +1,49 @@
+import os
+import re
+import pytest
+from src.checkpointer import SHARED_BACKENDS
+
+yaml = pytest.importorskip("yaml")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _requirements(file_name):
+    with open(os.path.join(ROOT, file_name), encoding="utf-8") as f:
+        names = [re.split(r"[=<>!~\[ ]", line.strip(), 1)[0] for line in f if line.strip() and not line.startswith("#")]
+    return {name.lower().replace("_", "-") for name in names}
+
+
+def _docker_requirements():
+    with open(os.path.join(ROOT, "Dockerfile"), encoding="utf-8") as f:
+        return re.search(r"pip install .*-r (\S+)", f.read()).group(1)
+
+
+def _api_environment():
+    with open(os.path.join(ROOT, "docker-compose.yml"), encoding="utf-8") as f:
+        compose = yaml.safe_load(f)
+    environment = dict(entry.split("=", 1) for entry in compose["services"]["api"]["environment"])
+    # Resolve ${NAME:-default} to its default, as compose does without the variable set
+    return {name: re.sub(r"\$\{\w+:-([^}]*)\}", r"\1", value) for name, value in environment.items()}
+
+
+def test_compose_api_workers_share_checkpoints_the_image_can_import():
+    environment = _api_environment()
+    if int(environment.get("RAG_API_WORKERS", "1")) == 1:
+        return
+    backend = environment.get("CHECKPOINT_BACKEND", "memory")
+    assert backend in SHARED_BACKENDS
+    for file_name in (_docker_requirements(), "requirements.txt"):
+        assert SHARED_BACKENDS[backend] in _requirements(file_name), file_name
+
+
+def test_headless_pipeline_does_not_import_streamlit():
+    pytest.importorskip("langchain_groq")
+    pytest.importorskip("langchain_openai")
+    import subprocess
+    import sys
+
+    # A fresh interpreter, since other tests may have imported Streamlit already
+    check = "import sys, src.rag; assert 'streamlit' not in sys.modules, 'streamlit imported'"
+    result = subprocess.run([sys.executable, "-c", check], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,68 @@
+import numpy as np
+from src.embedding_cache import EmbeddingCache, cache_key
+
+DIMENSIONS = 4
+
+
+def vectors(count, start=0):
+    return np.arange(start, start + count * DIMENSIONS, dtype=np.float32).reshape(count, DIMENSIONS)
+
+
+def keys(count, start=0):
+    return [cache_key("model", f"text {i}") for i in range(start, start + count)]
+
+
+def test_round_trip(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.f32"), DIMENSIONS)
+    cache.put_many(keys(3), vectors(3))
+    found = cache.get_many(keys(4))
+    assert found[3] is None
+    np.testing.assert_array_equal(np.stack(found[:3]), vectors(3))
+    assert cache.stats()["hits"] == 3
+
+
+def test_records_appended_by_another_process_are_seen(tmp_path):
+    path = str(tmp_path / "cache.f32")
+    reader, writer = EmbeddingCache(path, DIMENSIONS), EmbeddingCache(path, DIMENSIONS)
+    assert reader.get_many(keys(1)) == [None]
+    writer.put_many(keys(2), vectors(2))
+    np.testing.assert_array_equal(reader.get_many(keys(2))[1], vectors(2)[1])
+
+
+def test_compaction_keeps_the_newest_records(tmp_path):
+    path = str(tmp_path / "cache.f32")
+    record_bytes = 16 + DIMENSIONS * 4
+    cache = EmbeddingCache(path, DIMENSIONS, max_bytes=10 * record_bytes)
+    for i in range(12):
+        cache.put_many(keys(1, i), vectors(1, i))
+    assert cache.stats()["compactions"] == 1
+    found = cache.get_many(keys(12))
+    assert found[0] is None
+    np.testing.assert_array_equal(found[11], vectors(1, 11)[0])
+
+
+def test_reader_survives_compaction_between_stat_and_map(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.f32")
+    record_bytes = 16 + DIMENSIONS * 4
+    reader = EmbeddingCache(path, DIMENSIONS)
+    # The 12th record triggers the compaction
+    writer = EmbeddingCache(path, DIMENSIONS, max_bytes=11 * record_bytes)
+    writer.put_many(keys(10), vectors(10))
+    reader.get_many(keys(1))
+    writer.put_many(keys(1, 10), vectors(1, 10))
+
+    memmap = np.memmap
+
+    def compact_then_map(*args, **kwargs):
+        # Another process compacts (replacing the file with a smaller one) right before the reader maps it
+        monkeypatch.setattr(np, "memmap", memmap)
+        writer.put_many(keys(1, 11), vectors(1, 11))
+        return memmap(*args, **kwargs)
+
+    monkeypatch.setattr(np, "memmap", compact_then_map)
+    found = reader.get_many([keys(1, 10)[0]])
+    np.testing.assert_array_equal(found[0], vectors(1, 10)[0])
+    # The next lookup notices the new inode and reindexes the compacted file
+    found = reader.get_many([keys(1, 11)[0], keys(1)[0]])
+    np.testing.assert_array_equal(found[0], vectors(1, 11)[0])
+    assert found[1] is None
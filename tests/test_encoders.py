@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from src import encoders
+
+TEXTS = [
+    "Starship is the most powerful rocket ever built",
+    "Tesla FSD v12 is rolling out to more cars",
+    "Neuralink's first patient can control a cursor with thoughts",
+    "Free speech is the bedrock of a functioning democracy",
+    "The next launch attempt is scheduled for tomorrow morning",
+    "Mars will need a self-sustaining city of a million people",
+]
+QUERIES = ["When is the next Starship launch?", "What did Elon say about Neuralink?"]
+
+
+@pytest.mark.parametrize("quantization, file_name", [
+    ("avx2", "onnx/model_quint8_avx2.onnx"),
+    ("arm64", "onnx/model_qint8_arm64.onnx"),
+    ("avx512", "onnx/model_qint8_avx512.onnx"),
+    ("avx512_vnni", "onnx/model_qint8_avx512_vnni.onnx"),
+])
+def test_onnx_file_name_matches_the_exported_variant(quantization, file_name):
+    assert encoders.onnx_file_name(quantization) == file_name
+
+
+def test_onnx_backend_matches_torch():
+    pytest.importorskip("sentence_transformers")
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("optimum")
+    from benchmarks.encoders import parity
+
+    torch_embeddings = encoders.embed_texts(TEXTS, backend="torch", cache=False)
+    onnx_embeddings = encoders.embed_texts(TEXTS, backend="onnx", cache=False)
+    assert encoders.get_embedder("onnx").backend == "onnx"
+
+    pairs = [(query, text) for query in QUERIES for text in TEXTS]
+    torch_scores = np.asarray(encoders.rerank_scores(pairs, backend="torch")).reshape(len(QUERIES), -1)
+    onnx_scores = np.asarray(encoders.rerank_scores(pairs, backend="onnx")).reshape(len(QUERIES), -1)
+
+    report = parity(torch_embeddings, onnx_embeddings, torch_scores, onnx_scores, k=3)
+    # Same thresholds as benchmarks/encoders.py
+    assert report["embedding_cosine_min"] >= 0.98
+    assert report["rerank_spearman_min"] >= 0.95
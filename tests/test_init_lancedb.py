@@ -0,0 +1,27 @@
+import importlib
+import os
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(scope="module")
+def init_lancedb(tmp_path_factory):
+    # init_lancedb opens its database directory on import
+    os.environ.setdefault("LANCEDB_PATH", str(tmp_path_factory.mktemp("lancedb")))
+    return importlib.import_module("init_lancedb")
+
+
+def test_parse_created_at_handles_mixed_formats(init_lancedb):
+    values = pd.Series([
+        "2025-08-09 02:55:54+00:00",        # the scraper's CSV format
+        "Sat Aug 09 02:55:54 +0000 2025",   # the X API's format
+        "2025-08-09T02:55:54Z",
+        "2025-08-09 04:55:54+02:00",
+        "not a date",
+        None,
+    ])
+    parsed = init_lancedb.parse_created_at(values)
+
+    assert str(parsed.dtype) == "datetime64[us]"
+    assert (parsed[:4] == pd.Timestamp("2025-08-09 02:55:54")).all()
+    assert (parsed[4:] == pd.Timestamp(0)).all()
@@ -0,0 +1,188 @@
+import time
+from typing import Any
+import pytest
+
+pytest.importorskip("langchain_groq")
+pytest.importorskip("langchain_openai")
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+from src import llm_dispatch
+
+MESSAGES = [HumanMessage(content="What did Elon tweet about Starship?")]
+
+
+class ProviderError(Exception):
+    """Shaped like the Groq and OpenAI SDK errors: a status code and the HTTP response"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"status_code": status_code, "headers": headers or {}})()
+
+
+class FakeChatModel(BaseChatModel):
+    """Streams ``answer`` word by word after ``latency`` seconds, or raises ``error``"""
+
+    answer: str = "Starship is big"
+    latency: float = 0.0
+    error: Any = None
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        for word in self.answer.split():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+def dispatcher(*llms):
+    return llm_dispatch.HedgedChatModel(providers=[
+        llm_dispatch.Provider(f"provider{i}", llm, skippable=len(llms) > 1) for i, llm in enumerate(llms)])
+
+
+@pytest.fixture(autouse=True)
+def fast_timings(monkeypatch):
+    monkeypatch.setattr(llm_dispatch, "hedging", True)
+    monkeypatch.setattr(llm_dispatch, "default_hedge_delay", 0.1)
+    monkeypatch.setattr(llm_dispatch, "first_token_timeout", 5.0)
+    monkeypatch.setattr(llm_dispatch, "breaker_failures", 2)
+    monkeypatch.setattr(llm_dispatch, "breaker_cooldown", 0.3)
+
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = FakeChatModel(answer="primary"), FakeChatModel(answer="secondary")
+    assert dispatcher(primary, secondary).invoke(MESSAGES).content.strip() == "primary"
+    assert secondary.calls == 0
+
+
+def test_slow_primary_is_hedged_and_the_hedge_wins():
+    primary, secondary = FakeChatModel(answer="primary", latency=1.0), FakeChatModel(answer="secondary")
+    model = dispatcher(primary, secondary)
+
+    start = time.monotonic()
+    assert model.invoke(MESSAGES).content.strip() == "secondary"
+    assert time.monotonic() - start < 0.8
+    assert model.providers[1].counts["hedges"] == 1
+    assert model.providers[1].counts["wins"] == 1
+    assert model.providers[0].counts["wins"] == 0
+
+
+def test_fails_over_on_error_without_waiting_for_the_hedge(monkeypatch):
+    monkeypatch.setattr(llm_dispatch, "hedging", False)
+    primary, secondary = FakeChatModel(error=ProviderError(500)), FakeChatModel(answer="secondary")
+    model = dispatcher(primary, secondary)
+
+    assert model.invoke(MESSAGES).content.strip() == "secondary"
+    assert model.providers[0].counts["errors"] == 1
+    assert model.providers[1].counts["hedges"] == 0
+
+
+def test_rate_limited_provider_is_skipped_for_its_retry_after():
+    primary = FakeChatModel(answer="primary", error=ProviderError(429, {"retry-after": "0.3"}))
+    secondary = FakeChatModel(answer="secondary")
+    model = dispatcher(primary, secondary)
+
+    assert model.invoke(MESSAGES).content.strip() == "secondary"
+    assert model.providers[0].state() == "rate_limited"
+    model.invoke(MESSAGES)
+    assert primary.calls == 1
+
+    time.sleep(0.35)
+    primary.error = None
+    assert model.invoke(MESSAGES).content.strip() == "primary"
+    assert model.providers[0].state() == "closed"
+
+
+def test_single_provider_is_not_blocked_by_a_rate_limit():
+    primary = FakeChatModel(answer="primary", error=ProviderError(429, {"retry-after": "30"}))
+    model = dispatcher(primary)
+
+    with pytest.raises(ProviderError):
+        model.invoke(MESSAGES)
+    assert model.providers[0].state() == "closed"
+    primary.error = None
+    assert model.invoke(MESSAGES).content.strip() == "primary"
+    assert primary.calls == 2
+    assert model.providers[0].counts["rate_limited"] == 1
+
+
+def test_single_provider_keeps_being_called_after_server_errors():
+    primary = FakeChatModel(answer="primary", error=ProviderError(503))
+    model = dispatcher(primary)
+
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            model.invoke(MESSAGES)
+    assert primary.calls == 3
+    assert model.providers[0].state() == "closed"
+    primary.error = None
+    assert model.invoke(MESSAGES).content.strip() == "primary"
+
+
+def test_circuit_breaker_opens_half_opens_and_closes():
+    primary, secondary = FakeChatModel(answer="primary", error=ProviderError(503)), FakeChatModel(answer="secondary")
+    model = dispatcher(primary, secondary)
+
+    for _ in range(2):
+        assert model.invoke(MESSAGES).content.strip() == "secondary"
+    assert model.providers[0].state() == "open"
+    model.invoke(MESSAGES)
+    assert primary.calls == 2
+
+    time.sleep(0.35)
+    assert model.providers[0].state() == "half_open"
+    primary.error = None
+    assert model.invoke(MESSAGES).content.strip() == "primary"
+    assert model.providers[0].state() == "closed"
+
+
+def test_all_providers_failing_raises():
+    model = dispatcher(FakeChatModel(error=ProviderError(500)), FakeChatModel(error=ProviderError(503)))
+    with pytest.raises(RuntimeError, match="No LLM provider available"):
+        model.invoke(MESSAGES)
+
+
+@pytest.mark.parametrize("failover, own_key, providers, max_retries", [
+    (False, False, ["Groq"], 2),
+    (True, False, ["Groq", "OpenAI"], 0),
+    (True, True, ["Groq"], 2),
+])
+def test_server_keys_back_up_only_the_server_key_with_failover(monkeypatch, failover, own_key, providers, max_retries):
+    monkeypatch.setattr(llm_dispatch, "failover", failover)
+    monkeypatch.setattr(llm_dispatch, "default_keys", {"Groq": "server-groq", "OpenAI": "server-openai"})
+    monkeypatch.setattr(llm_dispatch, "_providers", {})
+    clients = []
+    monkeypatch.setattr(llm_dispatch, "get_llm",
+                        lambda name, api_key, max_retries=2: clients.append(max_retries) or FakeChatModel())
+
+    model = llm_dispatch.get_dispatcher("Groq", "user-groq" if own_key else "server-groq", own_key=own_key)
+    assert [provider.name for provider in model.providers] == providers
+    # A lone provider keeps its client's retries; with a fallback the dispatcher fails over instead
+    assert set(clients) == {max_retries}
+
+
+def test_idle_providers_and_dispatchers_are_evicted(monkeypatch):
+    monkeypatch.setattr(llm_dispatch, "_providers", {})
+    monkeypatch.setattr(llm_dispatch, "_dispatchers", {})
+    monkeypatch.setattr(llm_dispatch, "get_llm", lambda name, api_key, max_retries=2: FakeChatModel())
+
+    first = llm_dispatch.get_dispatcher("Groq", "user-key-1", own_key=True)
+    assert llm_dispatch.get_dispatcher("Groq", "user-key-1", own_key=True) is first
+
+    monkeypatch.setattr(llm_dispatch, "idle_ttl", 0.0)
+    time.sleep(0.01)
+    llm_dispatch.get_dispatcher("Groq", "user-key-2", own_key=True)
+    assert len(llm_dispatch._providers) == 1
+    assert len(llm_dispatch._dispatchers) == 1
+    assert llm_dispatch.get_dispatcher("Groq", "user-key-1", own_key=True) is not first
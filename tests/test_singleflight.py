@@ -0,0 +1,60 @@
+import threading
+import time
+from src.singleflight import SharedIterator, SingleFlight
+
+
+def test_none_items_do_not_end_the_stream():
+    shared = SharedIterator(iter(["a", None, "", "b"]))
+    assert list(shared) == ["a", None, "", "b"]
+    assert list(shared) == ["a", None, "", "b"]
+
+
+def test_follower_reruns_the_work_when_the_stream_was_abandoned_before_it_joined():
+    flight = SingleFlight("test")
+    closed = []
+
+    def leader_tokens():
+        try:
+            yield from ["one", "two", "three"]
+        finally:
+            closed.append(True)
+
+    shared, leader = flight.share("key", leader_tokens)
+    follower, follower_leads = flight.share("key", lambda: iter(["mine"]))
+    assert leader and not follower_leads
+
+    stream = iter(shared)
+    assert next(stream) == "one"
+    stream.close()
+    assert closed
+
+    assert list(follower.join(lambda: iter(["mine"]))) == ["mine"]
+    # A new caller starts a fresh stream instead of joining the abandoned one
+    assert flight.share("key", leader_tokens)[1]
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+    follower.start()
+    while flight.stats()["coalesced"] == 0:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [("result", False), ("result", True)]
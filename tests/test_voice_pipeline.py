@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("langchain_groq")
+pytest.importorskip("langchain_openai")
+
+from src import voice_pipeline
+
+TRANSCRIPT = "What did Elon Musk tweet about Starship"
+
+
+@pytest.fixture(autouse=True)
+def streamed_transcript(monkeypatch):
+    def transcribe_stream(audio, on_update=None):
+        on_update(TRANSCRIPT, False)
+        return TRANSCRIPT
+    monkeypatch.setattr(voice_pipeline, "transcribe_stream", transcribe_stream)
+
+
+def test_speculative_hit_is_reused():
+    queries = []
+    turn = voice_pipeline.VoiceTurn(b"audio", retrieve=lambda query: queries.append(query) or ("context", []))
+
+    assert turn.retrieval() == ("context", [])
+    assert turn.speculation() == "hit"
+    assert queries == [TRANSCRIPT]
+
+
+def test_failed_speculative_retrieval_is_retried_on_the_final_transcript():
+    queries = []
+
+    def retrieve(query):
+        queries.append(query)
+        if len(queries) == 1:
+            raise TimeoutError("database timed out")
+        return "context", []
+
+    errors = voice_pipeline.speculation_stats["errors"]
+    turn = voice_pipeline.VoiceTurn(b"audio", retrieve=retrieve)
+
+    assert turn.retrieval() == ("context", [])
+    assert queries == [TRANSCRIPT, TRANSCRIPT]
+    assert voice_pipeline.speculation_stats["errors"] == errors + 1
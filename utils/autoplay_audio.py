@@ -1,9 +1,7 @@
 import base64
 import streamlit as st
 
-def autoplay_audio(audio_file):
-    with open(audio_file, "rb") as audio_file:
-        audio_bytes = audio_file.read()
-    base64_audio = base64.b64encode(audio_bytes).decode("utf-8")
-    audio_html = f'<audio src="data:audio/mp3;base64,{base64_audio}" controls autoplay>'
-    st.markdown(audio_html, unsafe_allow_html=True)
\ No newline at end of file
+def autoplay_audio(audio_bytes, mime="audio/wav"):
+    base64_audio = base64.b64encode(bytes(audio_bytes)).decode("utf-8")
+    audio_html = f'<audio src="data:{mime};base64,{base64_audio}" controls autoplay>'
+    st.markdown(audio_html, unsafe_allow_html=True)
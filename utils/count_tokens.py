@@ -0,0 +1,97 @@
+import os
+import threading
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Tokenizers to count each model's prompts with, in order of preference, and its context window.
+# llama3's own tokenizer is gated on Hugging Face; cl100k_base is a close stand-in since llama3's
+# vocabulary extends it, and loads without a hub call or token.
+MODEL_TOKENIZERS = {
+    "llama3-8b-8192": (("cl100k_base",), 8192),
+    "gpt-3.5-turbo": (("cl100k_base",), 16385),
+}
+default_model = os.getenv("TOKENIZER_MODEL", "llama3-8b-8192")
+# Overrides the tokenizer of every model: a tiktoken encoding, or a Hugging Face tokenizer id such as
+# meta-llama/Meta-Llama-3-8B for exact llama3 counts (needs access to the repo)
+tokenizer_override = os.getenv("TOKENIZER")
+
+_lock = threading.Lock()
+# Counts made with the ~4 characters per token estimate because no tokenizer could be loaded
+estimated = 0
+
+class _HuggingFaceEncoding:
+    def __init__(self, tokenizer):
+        self._tokenizer = tokenizer
+
+    def encode(self, text, disallowed_special=()):
+        return self._tokenizer.encode(text, add_special_tokens=False)
+
+    def decode(self, tokens):
+        return self._tokenizer.decode(tokens)
+
+@lru_cache(maxsize=None)
+def _load(encoding_name):
+    try:
+        if "/" in encoding_name:
+            from transformers import AutoTokenizer
+            return _HuggingFaceEncoding(AutoTokenizer.from_pretrained(encoding_name))
+        import tiktoken
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        print(f"Tokenizer {encoding_name} unavailable: {str(e)}")
+        return None
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    names = (tokenizer_override,) if tokenizer_override else tokenizers(model)
+    for name in names:
+        encoding = _load(name)
+        if encoding is not None:
+            if name != names[0]:
+                print(f"Counting {model} tokens with {name}")
+            return encoding
+    print(f"No tokenizer for {model}, estimating token counts as characters / 4")
+    return None
+
+def _estimated():
+    global estimated
+    with _lock:
+        estimated += 1
+
+def tokenizers(model=None):
+    """Tokenizers for ``model`` in order of preference (the default model's if it is unknown)"""
+    return MODEL_TOKENIZERS.get(model or default_model, MODEL_TOKENIZERS[default_model])[0]
+
+def context_window(model=None):
+    """Context window of ``model`` in tokens (the default model's if it is unknown)"""
+    return MODEL_TOKENIZERS.get(model or default_model, MODEL_TOKENIZERS[default_model])[1]
+
+def load_tokenizers():
+    """Load every model's tokenizer, so the first counted prompt does not wait for it"""
+    for model in MODEL_TOKENIZERS:
+        _encoding(model)
+
+def count_tokens(text, model=None):
+    """Count tokens in ``text`` for ``model``; falls back to ~4 characters per token without a tokenizer"""
+    encoding = _encoding(model or default_model)
+    if encoding is None:
+        _estimated()
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_tokens(text, max_tokens, model=None):
+    """Return the longest prefix of ``text`` that fits in ``max_tokens`` tokens"""
+    encoding = _encoding(model or default_model)
+    if encoding is None:
+        _estimated()
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+def count_message_tokens(messages, model=None):
+    """Count tokens across chat messages, including a small per-message overhead"""
+    return sum(count_tokens(str(message.content), model) + 4 for message in messages)
@@ -0,0 +1,60 @@
+import threading
+from collections import deque
+
+
+class ValueStats:
+    """Thread-safe recorder of plain values keeping totals and a window of recent samples"""
+
+    def __init__(self, window=1024):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        with self._lock:
+            self._samples.append(value)
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, pct):
+        """Return the given percentile (0-100) over the recent window"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self):
+        """Return a dict with count, mean, max and p50/p95/p99"""
+        with self._lock:
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            "count": count,
+            "mean": total / count if count else 0.0,
+            "max": maximum,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class LatencyStats(ValueStats):
+    """Thread-safe latency recorder; samples are in seconds, snapshots in milliseconds"""
+
+    def snapshot(self):
+        """Return a dict with count, mean, max and p50/p95/p99 in milliseconds"""
+        with self._lock:
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            "count": count,
+            "mean_ms": (total / count * 1000) if count else 0.0,
+            "max_ms": maximum * 1000,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+        }